@@ -0,0 +1,160 @@
+import argparse
+import json
+import os
+import platform
+import random
+import time
+from common import episode, games
+from common.profiler import Profiler
+
+# Throughput benchmark for every game, no display needed.
+#   python bench.py                    all games, results appended to bench-results.json
+#   python bench.py fov --episodes 10
+# Each run is compared with the previous one in the results file, so regressions show up.
+
+SEED = 1
+
+
+def play(Sim, net, seed, profiler=None):
+    # one headless episode through common/episode.py, returns the frames played.
+    # profiler times its phases like `run.py train --profile` does
+    sim = Sim(games.WIDTH, games.HEIGHT, seed)
+    if profiler is not None:
+        sim.profiler = profiler
+        profiler.start()
+    episode.play(sim, net, profiler=profiler)
+    return sim.frames
+
+
+def seconds(profiler):
+    # network time and the rest of the frame (observe, physics, reward)
+    network = profiler.totals["network"]
+    return network, sum(profiler.totals.values()) - network
+
+
+def bench_episodes(game, config, episodes):
+    import neat
+    Sim = games.load(game, "Sim").Sim
+    net = neat.nn.FeedForwardNetwork.create(games.best_genome(game), config)
+
+    start = time.perf_counter()
+    frames = sum(play(Sim, net, seed) for seed in range(episodes))
+    elapsed = time.perf_counter() - start
+
+    # a second, profiled pass to see where the time goes
+    profiler = Profiler()
+    for seed in range(episodes):
+        play(Sim, net, seed, profiler)
+    network, sim = seconds(profiler)
+    return {
+        "frames_per_sec": frames / elapsed,
+        "seconds_per_episode": elapsed / episodes,
+        "network_share": network / (network + sim),
+        "network_seconds_per_episode": network / episodes,
+        "sim_seconds_per_episode": sim / episodes,
+    }
+
+
+def population(config):
+    import neat
+    random.seed(SEED)
+    return list(neat.Population(config).population.items())
+
+
+def bench_serial(game, config):
+    import neat
+    Sim = games.load(game, "Sim").Sim
+    genomes = population(config)
+    profiler = Profiler()
+    frames = 0
+    start = time.perf_counter()
+    for key, genome in genomes:
+        net = neat.nn.FeedForwardNetwork.create(genome, config)
+        frames += play(Sim, net, key, profiler)
+    elapsed = time.perf_counter() - start
+    return generation_stats(len(genomes), frames, elapsed, profiler)
+
+
+def bench_batch(game, config):
+    from common.batch import BatchEvaluator, run_batch
+    from common.compiled import CompiledNetwork, NetworkStack
+    BatchSim = games.load(game, "BatchSim").BatchSim
+    genomes = population(config)
+
+    start = time.perf_counter()
+    BatchEvaluator(BatchSim, games.WIDTH, games.HEIGHT, SEED).evaluate(genomes, config)
+    elapsed = time.perf_counter() - start
+
+    # a second, profiled pass through run_batch, the same phases as episode.play
+    profiler = Profiler()
+    profiler.start()
+    stack = NetworkStack([CompiledNetwork.create(genome, config) for _, genome in genomes])
+    profiler.lap("network")
+    sim = BatchSim(games.WIDTH, games.HEIGHT, [key for key, _ in genomes])
+    run_batch(sim, stack, profiler=profiler)
+    return generation_stats(len(genomes), sim.frames * sim.n, elapsed, profiler)
+
+
+def generation_stats(count, frames, elapsed, profiler):
+    network, sim = seconds(profiler)
+    return {
+        "genomes": count,
+        "seconds_per_generation": elapsed,
+        "genome_evals_per_sec": count / elapsed,
+        "frames_per_sec": frames / elapsed,
+        "network_share": network / (network + sim),
+    }
+
+
+def compare(previous, current, prefix=""):
+    # print how much each number moved since the last run
+    for name, value in current.items():
+        if isinstance(value, dict):
+            compare(previous.get(name, {}), value, f"{prefix}{name}.")
+        elif name in previous and previous[name]:
+            change = (value - previous[name]) / abs(previous[name]) * 100
+            print(f"  {prefix}{name}: {previous[name]:.4g} -> {value:.4g} ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark frames/sec and generation time of every game")
+    parser.add_argument("games", nargs="*", help=f"any of {', '.join(games.GAMES)}, defaults to all of them")
+    parser.add_argument("--episodes", type=int, default=5, help="episodes of best.pickle per game")
+    parser.add_argument("--no-batch", action="store_true", help="skip the BatchSim generation")
+    parser.add_argument("--out", default=os.path.join(games.ROOT, "bench-results.json"))
+    args = parser.parse_args()
+    for game in args.games:
+        if game not in games.GAMES:
+            parser.error(f"unknown game {game!r}")
+
+    results = {}
+    for game in args.games or games.GAMES:
+        config = games.config(game)
+        results[game] = {
+            "episode": bench_episodes(game, config, args.episodes),
+            "generation_serial": bench_serial(game, config),
+        }
+        if not args.no_batch:
+            results[game]["generation_batch"] = bench_batch(game, config)
+        print(game, json.dumps(results[game], indent=2))
+
+    history = []
+    if os.path.exists(args.out):
+        with open(args.out) as f:
+            history = json.load(f)
+    if history:
+        print(f"compared with the run from {history[-1]['time']}:")
+        compare(history[-1]["results"], results)
+    history.append({
+        "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "results": results,
+    })
+    with open(args.out, "w") as f:
+        json.dump(history, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
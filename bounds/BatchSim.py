@@ -0,0 +1,83 @@
+import random
+import numpy as np
+from common.sim import rect_round
+from Sim import FRAMES, OUT_OF_BOUNDS, PLAYER_SIZE, TARGET_SIZE, REWARD
+
+# the bounds game for a whole population at once. Every agent gets the same rules as Sim,
+# but positions, targets and fitness are numpy arrays and all agents move in lockstep
+
+
+class BatchSim:
+    horizon = FRAMES
+    penalty = OUT_OF_BOUNDS
+    # network outputs per agent that step() reads
+    actions = 4
+    # set to reward.zeros(n) to add up what every reward term earned, per agent
+    contributions = None
+
+    def __init__(self, width, height, seeds, reward=REWARD) -> None:
+        self.n = len(seeds)
+        self.width = width
+        self.height = height
+        self.reward = reward
+        # one generator per agent so agent i sees exactly what Sim(seed=seeds[i]) would
+        self.randoms = [random.Random(seed) for seed in seeds]
+        self.speed = 5 # max speed
+        self.x = np.full(self.n, rect_round(width / 2) - PLAYER_SIZE // 2)
+        self.y = np.full(self.n, rect_round(height / 2) - PLAYER_SIZE // 2)
+        self.tx = np.zeros(self.n, dtype=int)
+        self.ty = np.zeros(self.n, dtype=int)
+        self.fitness = np.zeros(self.n)
+        self.frames = 0
+
+    @property
+    def done(self):
+        return self.frames >= FRAMES
+
+    def out_of_bounds(self):
+        return ~((self.x > 0) & (self.x < self.width) & (self.y > 0) & (self.y < self.height))
+
+    def deciding(self):
+        # every agent needs a network output every frame
+        return np.arange(self.n)
+
+    def deltas(self):
+        # dx and dy from target to player centers
+        dx = (self.x + PLAYER_SIZE // 2) - (self.tx + TARGET_SIZE // 2)
+        dy = (self.y + PLAYER_SIZE // 2) - (self.ty + TARGET_SIZE // 2)
+        return dx, dy, np.sqrt(dx * dx + dy * dy)
+
+    def rects(self):
+        # what common/viewer.py draws: (layer, agent, x, y, width, height), agent -1 is scenery
+        agents = np.arange(self.n)
+        return [("target", agents, self.tx, self.ty, TARGET_SIZE, TARGET_SIZE),
+                ("player", agents, self.x, self.y, PLAYER_SIZE, PLAYER_SIZE)]
+
+    def observe(self):
+        return np.stack(self.deltas(), axis=1).astype(float)
+
+    # advance every agent one frame from an (n, 4) array of network outputs and return the rewards
+    def step(self, outputs):
+        dist = self.deltas()[2]
+        dec = np.argmax(outputs, axis=1)
+        self.y += self.speed * ((dec == 1).astype(int) - (dec == 0))
+        self.x += self.speed * ((dec == 3).astype(int) - (dec == 2))
+
+        outside = self.out_of_bounds()
+        hit = (self.x < self.tx + TARGET_SIZE) & (self.tx < self.x + PLAYER_SIZE) & \
+              (self.y < self.ty + TARGET_SIZE) & (self.ty < self.y + PLAYER_SIZE)
+        closer = self.deltas()[2] < dist
+        reward = self.reward.batch({
+            "out_of_bounds": outside,
+            "target": hit,
+            "closer": closer,
+            "farther": ~closer,
+        }, self.n, self.contributions)
+        self.fitness += reward
+
+        if self.frames % 200 == 0:
+            for i, rng in enumerate(self.randoms):
+                self.tx[i] = rng.randint(30, self.width-30) - TARGET_SIZE // 2
+                self.ty[i] = rng.randint(30, self.height-30) - TARGET_SIZE // 2
+        self.frames += 1
+        return reward
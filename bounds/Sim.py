@@ -0,0 +1,124 @@
+import math
+import random
+from common.rewards import Reward, Term
+from common.sim import rect_round, overlap
+
+# pygame-free simulation of the bounds game. Game.py only reads this state to draw it
+
+FRAMES = 1000
+# fitness lost for every frame spent off screen
+OUT_OF_BOUNDS = -2
+PLAYER_SIZE = 20
+TARGET_SIZE = 10
+
+# what a frame is worth, the first final term that happens decides it. See common/rewards.py
+REWARD = Reward(
+    Term("out_of_bounds", OUT_OF_BOUNDS, final=True),
+    Term("target", 1, final=True),
+    # distance to the target
+    Term("closer", 0.15),
+    Term("farther", -0.1),
+)
+
+
+class Sim:
+    horizon = FRAMES
+    penalty = OUT_OF_BOUNDS
+    # set to a Profiler to time the movement apart from the reward, see common/profiler.py
+    profiler = None
+    # set to reward.zeros() to add up what every reward term earned
+    contributions = None
+
+    def __init__(self, width, height, seed=None, reward=REWARD) -> None:
+        self.width = width
+        self.height = height
+        self.reward = reward
+        # every random choice comes from here, so a seed replays the exact same episode
+        self.random = random.Random(seed)
+        self.speed = 5 # max speed
+        # positions are top left corners, like pg.Rect
+        self.x = rect_round(width / 2) - PLAYER_SIZE // 2
+        self.y = rect_round(height / 2) - PLAYER_SIZE // 2
+        self.tx = 0
+        self.ty = 0
+        # when set, the target is not moved around (the front-end moves it instead)
+        self.hold_target = False
+        self.frames = 0
+
+    @property
+    def done(self):
+        return self.frames >= FRAMES
+
+    @property
+    def player_rect(self):
+        return (self.x, self.y, PLAYER_SIZE, PLAYER_SIZE)
+
+    @property
+    def target_rect(self):
+        return (self.tx, self.ty, TARGET_SIZE, TARGET_SIZE)
+
+    def out_of_bounds(self):
+        return not (self.x > 0 and self.x < self.width and self.y > 0 and self.y < self.height)
+
+    def center(self):
+        return self.x + PLAYER_SIZE // 2, self.y + PLAYER_SIZE // 2
+
+    def target_center(self):
+        return self.tx + TARGET_SIZE // 2, self.ty + TARGET_SIZE // 2
+
+    def move_target(self, center):
+        self.tx = rect_round(center[0]) - TARGET_SIZE // 2
+        self.ty = rect_round(center[1]) - TARGET_SIZE // 2
+
+    def snapshot(self):
+        # what a frame looks like, one row of a replay log (common/replay.py)
+        return {"x": self.x, "y": self.y, "tx": self.tx, "ty": self.ty}
+
+    def restore(self, row):
+        # back to a frame of a replay log, for drawing it
+        self.x, self.y, self.tx, self.ty = row["x"], row["y"], row["tx"], row["ty"]
+
+    def observe(self):
+        # dx and dy from target to player
+        (px, py), (tx, ty) = self.center(), self.target_center()
+        dx, dy = px - tx, py - ty
+        return (dx, dy, math.sqrt(dx * dx + dy * dy))
+
+    # advance one frame using the network output and return the reward earned
+    def step(self, output):
+        dist = self.observe()[2]
+        reward = self.act(output, dist)
+        if not self.hold_target and self.frames % 200 == 0:
+            self.move_target((self.random.randint(30, self.width-30), self.random.randint(30, self.height-30)))
+        self.frames += 1
+        return reward
+
+    def act(self, output, dist):
+        dec = max(range(len(output)), key=output.__getitem__)
+        # move up
+        if dec == 0:
+            self.y -= self.speed
+        # move down
+        elif dec == 1:
+            self.y += self.speed
+        # move left
+        elif dec == 2:
+            self.x -= self.speed
+        # move right
+        elif dec == 3:
+            self.x += self.speed
+
+        if self.profiler is not None:
+            self.profiler.lap("physics")
+
+        outside = self.out_of_bounds()
+        hit = not outside and overlap(*self.player_rect, *self.target_rect)
+        # nothing after a final term counts, so the new distance is only measured when it can
+        moved = not outside and not hit
+        closer = moved and self.observe()[2] < dist
+        return self.reward.one({
+            "out_of_bounds": outside,
+            "target": hit,
+            "closer": closer,
+            "farther": moved and not closer,
+        }, self.contributions)
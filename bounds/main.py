@@ -1,52 +1,11 @@
-import neat
-import pickle
-import pygame as pg
-from Game import Game
+import os
+import sys
 
-# initialize pygame
-pg.init()
-width, height = 500, 500
-
-def build_clip(frames):
-    import moviepy.video.io.ImageSequenceClip
-
-    clip = moviepy.video.io.ImageSequenceClip.ImageSequenceClip(frames, fps=120)
-    clip.write_videofile('../clips/bounds-best.mp4')
-
-def eval_genomes(genomes, config):
-    win = pg.display.set_mode((width, height))
-    pg.display.set_caption("Evalutating genomes")
-
-    for i, (_, genome) in enumerate(genomes):
-        print(round(i/len(genomes) * 100), end=" ")
-        genome.fitness = 0
-        Game(win, width, height).train(genome, config)
-
-def run_neat(config):
-    # p = neat.Checkpointer.restore_checkpoint('neat-checkpoint-9')
-    p = neat.Population(config)
-    p.add_reporter(neat.StdOutReporter(True))
-    stats = neat.StatisticsReporter()
-    p.add_reporter(stats)
-    p.add_reporter(neat.Checkpointer(2))
-
-    winner = p.run(eval_genomes, 15)
-    with open("best.pickle", "wb") as f:
-        pickle.dump(winner, f)
-
-def test_neat():
-    with open("best.pickle", "rb") as f:
-        genome = pickle.load(f)
-    win = pg.display.set_mode((width, height))
-    pg.display.set_caption("Testing genome")
-    frames = Game(win, width, height).test(genome, config, follow_mouse=True)
-    pg.quit()
-    return frames
+# training and testing live in run.py in the repo root, this keeps `python main.py` working.
+#   python main.py                  record best.pickle, as before
+#   python main.py train --seed 1   any other run.py arguments, for this game
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import run
 
 if __name__ == "__main__":
-    config = neat.Config(neat.DefaultGenome, neat.DefaultReproduction,
-                         neat.DefaultSpeciesSet, neat.DefaultStagnation,
-                         "config-feedforward.txt")
-    #run_neat(config)
-    frames = test_neat()
-    build_clip(frames)
+    run.main(["bounds", *(sys.argv[1:] or ["record", "--follow-mouse"])])
@@ -0,0 +1,120 @@
+import random
+import time
+import numpy as np
+from common.compiled import CompiledNetwork, NetworkStack
+from common.parallel import generation_seeds, aggregate
+
+
+def run_batch(sim, stack, stop=None, viewer=None, profiler=None):
+    # play a whole episode of a BatchSim, with one stacked forward pass for the population per frame.
+    # agents are grouped by genome, every genome's agents share its network as one batch.
+    # viewer draws the frames, see common/viewer.py. profiler times the phases of every frame like
+    # episode.play does (common/profiler.py), BatchSim.step has no lap between physics and reward
+    episodes = sim.n // stack.n
+    tracker = stop.start_batch(sim) if stop is not None else None
+    outputs = np.zeros((sim.n, stack.num_outputs))
+    if profiler is not None:
+        profiler.start()
+    while not sim.done:
+        deciding = sim.deciding()
+        if len(deciding):
+            obs = sim.observe()
+            if profiler is not None:
+                profiler.lap("observe")
+            outputs = stack.activate(obs.reshape(stack.n, episodes, -1)).reshape(sim.n, -1)
+            if profiler is not None:
+                profiler.lap("network")
+        sim.step(outputs)
+        if profiler is not None:
+            profiler.lap("reward")
+        # stopped agents keep moving with the rest, but their fitness is the extrapolated one
+        running = None
+        if tracker is not None:
+            running = tracker.update(sim.fitness, sim.frames, sim.out_of_bounds())
+        if viewer is not None:
+            viewer.frame(sim, running)
+        if profiler is not None:
+            profiler.lap("stop")
+        if running is not None and not running.any():
+            break
+    if tracker is not None:
+        return tracker.final(sim.fitness)
+    return sim.fitness
+
+
+class BatchEvaluator:
+    """
+    Evaluates a whole generation in one BatchSim instead of one Game per genome.
+    Seeds, scenarios and the cache work like ParallelEvaluator's, so both give the same fitness for a run seed.
+    A Viewer (common/viewer.py) draws every simulated agent while the generation plays, and reward_terms
+    prints what every reward term (common/rewards.py) added to the generation's fitness.
+    """
+    def __init__(self, batch_sim, width, height, seed=None, scenarios=None, stop=None, cache=None, fixed_seeds=False,
+                 viewer=None, reward_terms=False):
+        self.batch_sim = batch_sim
+        self.width = width
+        self.height = height
+        self.seed = seed if seed is not None else random.SystemRandom().getrandbits(32)
+        self.scenarios = scenarios
+        self.stop = stop
+        self.cache = cache
+        self.fixed_seeds = fixed_seeds
+        self.viewer = viewer
+        self.reward_terms = reward_terms
+        self.generation = 0
+
+    def evaluate(self, genomes, config):
+        seeds = generation_seeds(self.seed, 0 if self.fixed_seeds else self.generation, genomes, self.scenarios)
+        episodes = len(seeds[0])
+        results = [None] * len(genomes)
+        # genomes with every episode cached are not simulated, clones only once.
+        # owners[n] are the genomes that take the fitness of the n-th simulated one
+        play, owners, keys, pending = [], [], [], {}
+        for i, ((_, genome), episode_seeds) in enumerate(zip(genomes, seeds)):
+            if self.cache is not None:
+                key = tuple(self.cache.key(genome, s, self.stop) for s in episode_seeds)
+                if key in pending:
+                    owners[pending[key]].append(i)
+                    self.cache.hits += episodes
+                    continue
+                cached = [self.cache.get(k) for k in key]
+                if None not in cached:
+                    results[i] = cached
+                    continue
+                pending[key] = len(play)
+                keys.append(key)
+            play.append(i)
+            owners.append([i])
+
+        if play:
+            start = time.perf_counter()
+            stack = NetworkStack([CompiledNetwork.create(genomes[i][1], config) for i in play])
+            sim = self.batch_sim(self.width, self.height, [s for i in play for s in seeds[i]])
+            if self.viewer is not None:
+                self.viewer.start([genomes[i][1] for i in play], episodes)
+            if self.reward_terms:
+                sim.contributions = sim.reward.zeros(sim.n)
+            fitness = run_batch(sim, stack, self.stop, self.viewer).reshape(len(play), episodes).tolist()
+            if self.reward_terms:
+                # early stopped agents play on with the rest, but once every agent stopped the episode ends,
+                # so the terms may only cover part of it
+                print(f"Reward terms, {sim.frames} of {sim.horizon} frames:")
+                print(sim.reward.summary(sim.contributions, sim.n))
+            if self.cache is not None:
+                self.cache.timed(time.perf_counter() - start, len(play) * episodes)
+                for key, f in zip(keys, fitness):
+                    for k, x in zip(key, f):
+                        self.cache.put(k, x)
+            for f, slots in zip(fitness, owners):
+                for i in slots:
+                    results[i] = f
+
+        for (_, genome), f in zip(genomes, results):
+            genome.fitness = aggregate(f)
+        if self.stop is not None:
+            self.stop.next_generation([genome.fitness for _, genome in genomes])
+        self.generation += 1
+
+    def close(self):
+        if self.viewer is not None:
+            self.viewer.close()
@@ -0,0 +1,93 @@
+import collections
+import hashlib
+import shelve
+import neat
+
+# Fitness of already played episodes, so an identical network on the same episode is never simulated twice.
+# NEAT carries elites over unchanged and often produces clones, with a fixed episode seed
+# (scenarios, or --fixed-seeds) those are all cache hits.
+
+
+class FitnessCache:
+    """
+    LRU cache of episode fitness keyed by the network and the episode seed.
+    size is the number of episodes kept in memory. path adds a shelve file that keeps
+    every episode across runs, salt should change whenever the game's rules change so
+    old entries are not used (run.py uses a hash of the game's Sim.py).
+    """
+    def __init__(self, size=100000, path=None, salt=""):
+        self.size = size
+        self.salt = salt
+        self.entries = collections.OrderedDict()
+        self.store = shelve.open(path) if path else None
+        self.hits = 0
+        self.misses = 0
+        # time spent simulating the misses, to estimate what the hits saved
+        self.seconds = 0.0
+        self.simulated = 0
+
+    def key(self, genome, seed, stop=None):
+        # only what changes the network's outputs goes in: enabled connections, weights, biases, activations.
+        # Episodes with a random seed can not be replayed, so they are never cached
+        if seed is None:
+            return None
+        nodes = sorted((k, n.bias, n.response, n.activation, n.aggregation) for k, n in genome.nodes.items())
+        connections = sorted((k, c.weight) for k, c in genome.connections.items() if c.enabled)
+        # early stopped episodes get another fitness, so the rules are part of the key
+        rules = None if stop is None else (stop.patience, stop.out_of_bounds, stop.threshold, stop.grace)
+        text = repr((self.salt, nodes, connections, seed, rules))
+        return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+    def get(self, key):
+        if key is None:
+            return None
+        fitness = self.entries.get(key)
+        if fitness is None and self.store is not None:
+            fitness = self.store.get(key)
+            if fitness is not None:
+                self.remember(key, fitness)
+        if fitness is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return fitness
+
+    def put(self, key, fitness):
+        if key is None:
+            return
+        self.remember(key, fitness)
+        if self.store is not None:
+            self.store[key] = fitness
+
+    def remember(self, key, fitness):
+        self.entries[key] = fitness
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def timed(self, seconds, episodes):
+        self.seconds += seconds
+        self.simulated += episodes
+
+    def saved(self):
+        # estimated seconds the hits saved, at the average cost of a simulated episode
+        if not self.simulated:
+            return 0.0
+        return self.hits * self.seconds / self.simulated
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+
+class CacheReporter(neat.reporting.BaseReporter):
+    def __init__(self, cache):
+        self.cache = cache
+
+    def post_evaluate(self, config, population, species, best_genome):
+        c = self.cache
+        total = c.hits + c.misses
+        rate = c.hits / total * 100 if total else 0
+        print(f"Fitness cache: {c.hits} hits, {c.misses} misses ({rate:.1f}%), about {c.saved():.2f} sec saved")
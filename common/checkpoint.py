@@ -0,0 +1,280 @@
+import glob
+import itertools
+import math
+import os
+import pickle
+import random
+import struct
+import zlib
+import neat
+from neat.attributes import BoolAttribute, FloatAttribute, StringAttribute
+from common.pipeline import Pipeline, replace
+
+# Incremental checkpoints, a replacement for neat.Checkpointer.
+#
+# A genome never changes after it is created (mutation happens before a child joins the population),
+# so every genome is written once, into the snapshot of the generation it first appeared in.
+# Each snapshot file holds:
+#   - a manifest: generation, random state, counters, species, the fitness of every member and
+#     the snapshot file that holds each member's genes
+#   - the genes of the genomes that are new since the last snapshot, packed with struct
+# Files are compressed and written by a background thread (common/pipeline.py) while the next
+# generation plays. Old files are removed once no kept snapshot needs their genomes.
+
+SNAPSHOT = "snapshot-{:06d}.bin"
+
+
+def take(counter):
+    # the next value of an itertools.count, without losing it
+    value = next(counter)
+    return value, itertools.count(value)
+
+
+class GenomeCodec:
+    """
+    Packs genomes into bytes: the key and fitness, then every node and connection gene with the gene
+    type's attributes (floats as doubles so a resumed run continues bit for bit, strings as indices
+    into a table that only grows).
+    """
+    header = struct.Struct("<qdII")
+
+    def __init__(self, genome_type, genome_config, strings=()):
+        self.genome_type = genome_type
+        self.genome_config = genome_config
+        self.strings = list(strings)
+        self.index = {s: i for i, s in enumerate(self.strings)}
+        self.node_attributes = genome_config.node_gene_type._gene_attributes
+        self.connection_attributes = genome_config.connection_gene_type._gene_attributes
+        self.node = struct.Struct("<i" + self.codes(self.node_attributes))
+        self.connection = struct.Struct("<ii" + self.codes(self.connection_attributes))
+
+    @staticmethod
+    def codes(attributes):
+        codes = ""
+        for attribute in attributes:
+            if isinstance(attribute, FloatAttribute):
+                codes += "d"
+            elif isinstance(attribute, BoolAttribute):
+                codes += "?"
+            elif isinstance(attribute, StringAttribute):
+                codes += "H"
+            else:
+                raise TypeError(f"can not pack gene attribute {attribute.name} of type {type(attribute).__name__}")
+        return codes
+
+    def pack_value(self, attribute, value):
+        if not isinstance(attribute, StringAttribute):
+            return value
+        if value not in self.index:
+            self.index[value] = len(self.strings)
+            self.strings.append(value)
+        return self.index[value]
+
+    def unpack_value(self, attribute, value):
+        return self.strings[value] if isinstance(attribute, StringAttribute) else value
+
+    def pack(self, genome):
+        fitness = math.nan if genome.fitness is None else genome.fitness
+        parts = [self.header.pack(genome.key, fitness, len(genome.nodes), len(genome.connections))]
+        for key, gene in genome.nodes.items():
+            values = [self.pack_value(a, getattr(gene, a.name)) for a in self.node_attributes]
+            parts.append(self.node.pack(key, *values))
+        for (i, o), gene in genome.connections.items():
+            values = [self.pack_value(a, getattr(gene, a.name)) for a in self.connection_attributes]
+            parts.append(self.connection.pack(i, o, *values))
+        return b"".join(parts)
+
+    def unpack(self, data):
+        # every genome in a packed blob, by key
+        config = self.genome_config
+        genomes = {}
+        offset = 0
+        while offset < len(data):
+            key, fitness, nodes, connections = self.header.unpack_from(data, offset)
+            offset += self.header.size
+            genome = self.genome_type(key)
+            genome.fitness = None if math.isnan(fitness) else fitness
+            for _ in range(nodes):
+                node_key, *values = self.node.unpack_from(data, offset)
+                offset += self.node.size
+                gene = config.node_gene_type(node_key)
+                for a, value in zip(self.node_attributes, values):
+                    setattr(gene, a.name, self.unpack_value(a, value))
+                genome.nodes[node_key] = gene
+            for _ in range(connections):
+                i, o, *values = self.connection.unpack_from(data, offset)
+                offset += self.connection.size
+                gene = config.connection_gene_type((i, o))
+                for a, value in zip(self.connection_attributes, values):
+                    setattr(gene, a.name, self.unpack_value(a, value))
+                genome.connections[(i, o)] = gene
+            genomes[genome.key] = genome
+        return genomes
+
+
+class CheckpointStore(neat.reporting.BaseReporter):
+    """
+    Snapshots the population into directory every `every` generations and keeps the last `keep`.
+    start(config) resumes from the newest snapshot, or starts a new population if there is none.
+    meta is a dict saved along with every snapshot, e.g. the run seed.
+    """
+    def __init__(self, directory, every=1, keep=2):
+        self.directory = directory
+        self.every = every
+        self.keep = keep
+        self.meta = {}
+        self.population = None
+        self.generation = None
+        self.codec = None
+        # snapshot generation that holds each genome already written
+        self.written = {}
+        # snapshot files needed by each of the last `keep` snapshots, oldest first
+        self.kept = []
+        # at most two snapshots wait to be written, a slow disk holds training back instead of filling memory
+        self.writer = Pipeline(2, "checkpoint")
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, generation):
+        return os.path.join(self.directory, SNAPSHOT.format(generation))
+
+    def generations(self):
+        names = glob.glob(os.path.join(self.directory, SNAPSHOT.replace("{:06d}", "*")))
+        return sorted(int(os.path.basename(n)[9:-4]) for n in names)
+
+    def latest(self):
+        generations = self.generations()
+        return generations[-1] if generations else None
+
+    def clear(self):
+        self.writer.wait()
+        for generation in self.generations():
+            os.remove(self.path(generation))
+        self.written = {}
+        self.kept = []
+
+    def start(self, config, resume=True):
+        if not resume or self.latest() is None:
+            p = neat.Population(config)
+        else:
+            p = self.restore(config)
+        self.population = p
+        p.add_reporter(self)
+        return p
+
+    def read(self, generation):
+        with open(self.path(generation), "rb") as f:
+            return pickle.loads(zlib.decompress(f.read()))
+
+    def restore(self, config, generation=None):
+        generation = self.latest() if generation is None else generation
+        print("Resuming from", self.path(generation))
+        manifest, _ = self.read(generation)
+        self.codec = GenomeCodec(config.genome_type, config.genome_config, manifest["strings"])
+
+        genomes = {}
+        for file in sorted(set(manifest["files"].values())):
+            genomes.update(self.codec.unpack(self.read(file)[1]))
+        population = {}
+        for key, fitness in manifest["population"].items():
+            population[key] = genomes[key]
+            population[key].fitness = fitness
+
+        p = neat.Population(config, (population, None, generation))
+        species_set = config.species_set_type(config.species_set_config, p.reporters)
+        species_set.indexer = itertools.count(manifest["next_species"])
+        for s in manifest["species"]:
+            species = neat.species.Species(s["key"], s["created"])
+            species.last_improved = s["last_improved"]
+            species.fitness = s["fitness"]
+            species.adjusted_fitness = s["adjusted_fitness"]
+            species.fitness_history = s["fitness_history"]
+            species.representative = genomes[s["representative"]]
+            species.members = {key: population[key] for key in s["members"]}
+            for key in s["members"]:
+                species_set.genome_to_species[key] = s["key"]
+            species_set.species[s["key"]] = species
+        p.species = species_set
+        p.reproduction.genome_indexer = itertools.count(manifest["next_genome"])
+        if manifest["next_node"] is not None:
+            config.genome_config.node_indexer = itertools.count(manifest["next_node"])
+        if manifest["best"] is not None:
+            key, fitness = manifest["best"]
+            p.best_genome = genomes[key]
+            p.best_genome.fitness = fitness
+        random.setstate(manifest["random"])
+        self.meta = manifest["meta"]
+
+        self.written = dict(manifest["files"])
+        self.kept = [set(manifest["files"].values()) | {generation}]
+        return p
+
+    def start_generation(self, generation):
+        self.generation = generation
+
+    def end_generation(self, config, population, species_set):
+        # the population is the next generation's, so the snapshot is named after that one
+        generation = self.generation + 1
+        if generation % self.every == 0:
+            self.save(config, population, species_set, generation)
+
+    def save(self, config, population, species_set, generation):
+        if self.codec is None:
+            self.codec = GenomeCodec(config.genome_type, config.genome_config)
+        p = self.population
+        best = p.best_genome
+
+        # only genomes that are not in an earlier snapshot get packed
+        needed = dict(population)
+        for s in species_set.species.values():
+            needed[s.representative.key] = s.representative
+        if best is not None:
+            needed[best.key] = best
+        new = [genome for key, genome in needed.items() if key not in self.written]
+        blob = b"".join(self.codec.pack(genome) for genome in new)
+        files = {key: self.written.get(key, generation) for key in needed}
+
+        next_genome, p.reproduction.genome_indexer = take(p.reproduction.genome_indexer)
+        next_species, species_set.indexer = take(species_set.indexer)
+        next_node = None
+        if config.genome_config.node_indexer is not None:
+            next_node, config.genome_config.node_indexer = take(config.genome_config.node_indexer)
+        manifest = {
+            "generation": generation,
+            "population": {key: genome.fitness for key, genome in population.items()},
+            "species": [{
+                "key": s.key,
+                "created": s.created,
+                "last_improved": s.last_improved,
+                "fitness": s.fitness,
+                "adjusted_fitness": s.adjusted_fitness,
+                "fitness_history": list(s.fitness_history),
+                "representative": s.representative.key,
+                "members": list(s.members),
+            } for s in species_set.species.values()],
+            "files": files,
+            "best": None if best is None else (best.key, best.fitness),
+            "next_genome": next_genome,
+            "next_species": next_species,
+            "next_node": next_node,
+            "strings": list(self.codec.strings),
+            "random": random.getstate(),
+            "meta": dict(self.meta),
+        }
+        self.written = files
+        self.kept = (self.kept + [set(files.values()) | {generation}])[-self.keep:]
+
+        data = pickle.dumps((manifest, blob), protocol=pickle.HIGHEST_PROTOCOL)
+        print(f"Saving snapshot {self.path(generation)} ({len(new)} new genomes)")
+        self.writer.submit(self.write, generation, data, set().union(*self.kept))
+
+    def write(self, generation, data, needed):
+        # runs on the writer thread
+        replace(self.path(generation), zlib.compress(data, 6))
+        # snapshots are written in order, so every file not needed any more is already on disk
+        for old in self.generations():
+            if old not in needed:
+                os.remove(self.path(old))
+
+    def close(self):
+        # wait for the snapshots still being written, and raise if one failed
+        self.writer.close()
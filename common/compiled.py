@@ -0,0 +1,192 @@
+import numpy as np
+from neat.graphs import feed_forward_layers
+
+# numpy versions of neat's built-in activations, same clamping as neat.activations
+ACTIVATIONS = {
+    "relu": lambda z: np.maximum(z, 0.0),
+    "sigmoid": lambda z: 1.0 / (1.0 + np.exp(-np.clip(5.0 * z, -60.0, 60.0))),
+    "tanh": lambda z: np.tanh(np.clip(2.5 * z, -60.0, 60.0)),
+    "sin": lambda z: np.sin(np.clip(5.0 * z, -60.0, 60.0)),
+    "gauss": lambda z: np.exp(-5.0 * np.clip(z, -3.4, 3.4) ** 2),
+    "softplus": lambda z: 0.2 * np.log1p(np.exp(np.clip(5.0 * z, -60.0, 60.0))),
+    "identity": lambda z: z,
+    "clamped": lambda z: np.clip(z, -1.0, 1.0),
+    "abs": np.abs,
+    "hat": lambda z: np.maximum(0.0, 1 - np.abs(z)),
+    "square": lambda z: z ** 2,
+    "cube": lambda z: z ** 3,
+}
+
+
+class CompiledNetwork:
+    """
+    A feed-forward genome turned into one weight matrix per layer, in topological order.
+    Values are kept in a single row per input: the inputs first, then every evaluated node.
+    activate() is a drop-in for neat.nn.FeedForwardNetwork.activate, activate_batch() runs many inputs at once.
+    """
+    def __init__(self, input_nodes, output_nodes, layers, width):
+        self.input_nodes = input_nodes
+        self.output_nodes = output_nodes
+        # (columns, weights, bias, response, [(activation, positions in the layer)]) per layer
+        self.layers = layers
+        self.width = width
+        self.num_inputs = len(input_nodes)
+
+    @staticmethod
+    def create(genome, config):
+        genome_config = config.genome_config
+        connections = [cg.key for cg in genome.connections.values() if cg.enabled]
+        layers = feed_forward_layers(genome_config.input_keys, genome_config.output_keys, connections)
+
+        # outputs that never get evaluated stay 0, just like FeedForwardNetwork
+        order = list(genome_config.input_keys)
+        for layer in layers:
+            order += sorted(layer)
+        for key in genome_config.output_keys:
+            if key not in order:
+                order.append(key)
+        column = {key: i for i, key in enumerate(order)}
+
+        compiled = []
+        for layer in layers:
+            nodes = sorted(layer)
+            weights = np.zeros((len(order), len(nodes)))
+            for j, node in enumerate(nodes):
+                for inode, onode in connections:
+                    if onode == node:
+                        weights[column[inode], j] = genome.connections[(inode, onode)].weight
+            bias = np.array([genome.nodes[node].bias for node in nodes])
+            response = np.array([genome.nodes[node].response for node in nodes])
+
+            groups = {}
+            for j, node in enumerate(nodes):
+                ng = genome.nodes[node]
+                if ng.aggregation != "sum":
+                    raise ValueError(f"only sum aggregation can be compiled, node {node} uses {ng.aggregation}")
+                if ng.activation not in ACTIVATIONS:
+                    raise ValueError(f"no numpy version of the {ng.activation} activation")
+                groups.setdefault(ng.activation, []).append(j)
+            groups = [(ACTIVATIONS[name], np.array(positions)) for name, positions in groups.items()]
+            compiled.append((np.array([column[node] for node in nodes]), weights, bias, response, groups))
+
+        outputs = np.array([column[key] for key in genome_config.output_keys])
+        return CompiledNetwork(np.arange(len(genome_config.input_keys)), outputs, compiled, len(order))
+
+    def activate_batch(self, inputs):
+        # (batch, num_inputs) -> (batch, num_outputs)
+        inputs = np.asarray(inputs, dtype=float)
+        values = np.zeros((len(inputs), self.width))
+        values[:, :self.num_inputs] = inputs
+        for columns, weights, bias, response, groups in self.layers:
+            z = bias + response * (values @ weights)
+            if len(groups) == 1:
+                values[:, columns] = groups[0][0](z)
+            else:
+                for act, positions in groups:
+                    values[:, columns[positions]] = act(z[:, positions])
+        return values[:, self.output_nodes]
+
+    def activate(self, inputs):
+        if len(inputs) != self.num_inputs:
+            raise RuntimeError("Expected {0:n} inputs, got {1:n}".format(self.num_inputs, len(inputs)))
+        return self.activate_batch([inputs])[0].tolist()
+
+
+class NetworkStack:
+    """
+    Many compiled networks run as one stacked forward pass, grouped by topological depth.
+    The networks are sorted deepest first, so the ones that have a layer d are always the first rows,
+    and layer d is one matmul over just those rows. Every layer's nodes get the same contiguous
+    columns in every network, padded to the widest, and a layer only reads the columns before it.
+    A shallow network never pays for the deep ones, and networks without a single evaluated node
+    (outputs not connected yet) cost nothing. Padding weights are zero, so every network gives what its
+    own activate_batch() would, up to the order numpy adds the terms of a matmul in.
+    """
+    def __init__(self, nets):
+        self.n = len(nets)
+        self.num_inputs = nets[0].num_inputs
+        self.num_outputs = len(nets[0].output_nodes)
+        # stable, so networks of the same depth keep their order
+        order = sorted(range(self.n), key=lambda i: -len(nets[i].layers))
+        self.order = np.array(order)
+        nets = [nets[i] for i in order]
+        depth = len(nets[0].layers)
+        # rows of the networks that have layer d, and its columns
+        self.rows = [sum(len(net.layers) > d for net in nets) for d in range(depth)]
+        sizes = [max(len(net.layers[d][0]) for net in nets[:rows]) for d, rows in enumerate(self.rows)]
+        starts = np.cumsum([self.num_inputs] + sizes).tolist()
+        # the last column is never written, outputs no layer evaluates read their 0 from it
+        self.width = starts[-1] + 1
+        # old column of every network -> new column
+        moves = np.full((self.n, max(net.width for net in nets)), self.width - 1)
+        moves[:, :self.num_inputs] = np.arange(self.num_inputs)
+        for i, net in enumerate(nets):
+            for d, (cols, _, _, _, _) in enumerate(net.layers):
+                moves[i, cols] = starts[d] + np.arange(len(cols))
+
+        self.layers = []
+        for d, (rows, size) in enumerate(zip(self.rows, sizes)):
+            start = starts[d]
+            weights = np.zeros((rows, start, size))
+            bias = np.zeros((rows, 1, size))
+            response = np.zeros((rows, 1, size))
+            activations = {}
+            for i, net in enumerate(nets[:rows]):
+                cols, w, b, r, groups = net.layers[d]
+                # w has a row per old column, the ones of this and later layers are all zero
+                used = moves[i, :w.shape[0]] < start
+                weights[i, moves[i, :w.shape[0]][used], :len(cols)] = w[used]
+                bias[i, 0, :len(cols)] = b
+                response[i, 0, :len(cols)] = r
+                for act, positions in groups:
+                    activations.setdefault(act, np.zeros((rows, 1, size), dtype=bool))[i, 0, positions] = True
+            # a single activation (relu in all our configs) needs no masking
+            activations = list(activations) if len(activations) == 1 else list(activations.items())
+            self.layers.append((rows, start, weights, bias, response, activations))
+
+        # output columns of every network, in the order the networks were given
+        self.output_nodes = np.empty((self.n, self.num_outputs), dtype=int)
+        self.output_nodes[self.order] = [moves[i, net.output_nodes] for i, net in enumerate(nets)]
+        # values and flat output positions by batch size. Every column that is read is written first,
+        # so the values are reused from one call to the next
+        self.buffers = {}
+
+    def buffer(self, batch):
+        if batch not in self.buffers:
+            # row of every network in the sorted values, then the flat index of each of its outputs
+            position = np.empty(self.n, dtype=int)
+            position[self.order] = np.arange(self.n)
+            flat = (position[:, None, None] * batch + np.arange(batch)[None, :, None]) * self.width + \
+                   self.output_nodes[:, None, :]
+            self.buffers[batch] = (np.zeros((self.n, batch, self.width)), flat)
+        return self.buffers[batch]
+
+    def activate(self, inputs):
+        """
+        inputs is (n, num_inputs) with one row per network, or (n, batch, num_inputs)
+        to give every network its own batch. Returns outputs of the same leading shape.
+        """
+        inputs = np.asarray(inputs, dtype=float)
+        single = inputs.ndim == 2
+        if single:
+            inputs = inputs[:, None]
+        values, flat = self.buffer(inputs.shape[1])
+        if self.layers:
+            rows = self.layers[0][0]
+            values[:rows, :, :self.num_inputs] = inputs[self.order[:rows]]
+        for rows, start, weights, bias, response, activations in self.layers:
+            z = bias + response * np.matmul(values[:rows, :, :start], weights)
+            if len(activations) == 1:
+                out = activations[0](z)
+            else:
+                out = np.zeros_like(z)
+                for act, mask in activations:
+                    out = np.where(mask, act(z), out)
+            values[:rows, :, start:start + z.shape[2]] = out
+        outputs = values.take(flat)
+        return outputs[:, 0] if single else outputs
+
+
+def activate_many(nets, inputs):
+    # evaluate row i (or batch i) of inputs with nets[i] in one stacked pass
+    return NetworkStack(nets).activate(inputs)
@@ -0,0 +1,224 @@
+import queue
+import threading
+import time
+import traceback
+from multiprocessing.connection import Listener, Client
+import multiprocessing
+from common.parallel import ParallelEvaluator, init_worker
+
+# Training on more than one machine. The training process is the coordinator: it listens on a port and
+# hands out the episodes of a generation in batches to whichever workers are connected. A worker is
+# `run.py <game> worker` on any machine with this repo, it plays its batch headless and sends back the
+# fitness of every episode. Workers can come and go at any time: a batch whose worker disconnects (or,
+# with a timeout, takes too long) goes back in the queue for another one. Nothing but the standard
+# library's authenticated connections: they carry pickles, so anyone who knows the authkey can run code
+# on the coordinator and its workers. There is no default key, pick a long random one, and the port should
+# only be reachable by your own machines.
+#   python run.py fov train --listen 0.0.0.0:6000 --authkey KEY                coordinator
+#   python run.py fov worker --connect trainer:6000 --authkey KEY              on every other machine
+#   python run.py fov train --listen 6000 --local-workers 4                    only this machine, random key
+# Fitness is the same as ParallelEvaluator's for a run seed, whoever plays which batch.
+
+# seconds between two "waiting for workers" messages
+PATIENCE = 30
+
+
+def pack_genome(genome):
+    # only what a network is built from, about a third of a pickled genome: nodes and enabled connections,
+    # in the order of the genome so the network adds its inputs up in the same order
+    nodes = [(k, n.bias, n.response, n.activation, n.aggregation) for k, n in genome.nodes.items()]
+    connections = [(k, c.weight) for k, c in genome.connections.items() if c.enabled]
+    return genome.key, nodes, connections
+
+
+def unpack_genome(data, config):
+    key, nodes, connections = data
+    genome_config = config.genome_config
+    genome = config.genome_type(key)
+    for k, bias, response, activation, aggregation in nodes:
+        node = genome_config.node_gene_type(k)
+        node.bias, node.response, node.activation, node.aggregation = bias, response, activation, aggregation
+        genome.nodes[k] = node
+    for k, weight in connections:
+        connection = genome_config.connection_gene_type(k)
+        connection.weight, connection.enabled = weight, True
+        genome.connections[k] = connection
+    return genome
+
+
+def connect(address, authkey, wait=60):
+    # a worker may start before its coordinator
+    deadline = time.monotonic() + wait
+    while True:
+        try:
+            return Client(address, authkey=authkey)
+        except ConnectionRefusedError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(1)
+
+
+def work(address, authkey, wait=60):
+    """
+    A worker: plays the batches of the coordinator at address until it closes the connection.
+    The coordinator sends the eval function and the neat config first, then (generation, batch,
+    stop rules, [(packed genome, episode seed)]) batches.
+    """
+    init_worker()
+    connection = connect(address, authkey, wait)
+    eval_function = config = None
+    played = 0
+    with connection:
+        while True:
+            try:
+                message = connection.recv()
+            except EOFError:
+                break
+            if message[0] == "setup":
+                _, eval_function, config = message
+            elif message[0] == "batch":
+                _, generation, n, stop, jobs = message
+                try:
+                    answer = ("done", generation, n,
+                              [eval_function(unpack_genome(g, config), config, seed, stop) for g, seed in jobs])
+                    played += len(jobs)
+                except Exception:
+                    answer = ("error", generation, n, traceback.format_exc())
+                try:
+                    connection.send(answer)
+                except OSError:
+                    # the coordinator gave up on this worker
+                    break
+            else:
+                break
+    return played
+
+
+class DistributedEvaluator(ParallelEvaluator):
+    """
+    ParallelEvaluator whose episodes are played by workers connected over the network, batch_size
+    episodes per message. address is where the coordinator listens, (host, port), port 0 picks a free one
+    (self.address has it), and authkey the bytes every worker has to know.
+    local_workers starts that many worker processes on this machine.
+    A worker that does not answer a batch within timeout seconds is dropped and its batch requeued,
+    None waits for as long as its connection is up.
+    """
+    def __init__(self, eval_function, address, authkey, local_workers=0, batch_size=8,
+                 timeout=None, seed=None, scenarios=None, stop=None, cache=None, fixed_seeds=False):
+        if not authkey:
+            raise ValueError("DistributedEvaluator needs an authkey, whoever knows it can run code on the workers")
+        super().__init__(eval_function, 1, seed, scenarios=scenarios, stop=stop, cache=cache, fixed_seeds=fixed_seeds)
+        self.authkey = authkey
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.listener = Listener(address, authkey=authkey)
+        self.address = self.listener.address
+        self.closed = False
+        self.config = None
+        # batches waiting for a worker, and the answers. Every connected worker has a thread taking from todo
+        self.todo = queue.Queue()
+        self.answers = queue.Queue()
+        self.connected = 0
+        self.lock = threading.Lock()
+        self.threads = []
+        threading.Thread(target=self.accept, name="coordinator", daemon=True).start()
+        self.processes = [multiprocessing.Process(target=work, args=(self.local_address(), authkey), daemon=True)
+                          for _ in range(local_workers)]
+        for process in self.processes:
+            process.start()
+
+    def local_address(self):
+        # where a worker on this machine connects to
+        host, port = self.address
+        return ("localhost" if host in ("", "0.0.0.0") else host, port)
+
+    def accept(self):
+        while not self.closed:
+            try:
+                connection = self.listener.accept()
+            except (OSError, EOFError, multiprocessing.AuthenticationError):
+                # a client that failed the authentication, or the listener was closed
+                if self.closed:
+                    return
+                continue
+            if self.closed:
+                connection.close()
+                return
+            name = "%s:%s" % self.listener.last_accepted
+            thread = threading.Thread(target=self.serve, args=(connection, name), name="worker", daemon=True)
+            self.threads.append(thread)
+            thread.start()
+
+    def serve(self, connection, name):
+        # feeds one worker batches until it is lost or the evaluator closes
+        with self.lock:
+            self.connected += 1
+        print(f"Worker {name} connected, {self.connected} in total")
+        setup = None
+        batch = None
+        try:
+            while True:
+                batch = self.todo.get()
+                if batch is None:
+                    connection.send(("close",))
+                    return
+                if setup is not self.config:
+                    connection.send(("setup", self.eval_function, self.config))
+                    setup = self.config
+                connection.send(("batch", *batch))
+                if self.timeout is not None and not connection.poll(self.timeout):
+                    raise TimeoutError(f"no answer in {self.timeout} seconds")
+                self.answers.put(connection.recv())
+                batch = None
+        except (EOFError, OSError, TimeoutError) as e:
+            if batch is not None:
+                self.todo.put(batch)
+                print(f"Worker {name} lost ({str(e) or type(e).__name__}), {len(batch[-1])} episodes requeued")
+            else:
+                print(f"Worker {name} lost")
+        finally:
+            connection.close()
+            with self.lock:
+                self.connected -= 1
+
+    def run(self, jobs):
+        if not jobs:
+            return []
+        self.config = jobs[0][1]
+        stop = jobs[0][3]
+        batches = [jobs[i:i + self.batch_size] for i in range(0, len(jobs), self.batch_size)]
+        for n, batch in enumerate(batches):
+            self.todo.put((self.generation, n, stop, [(pack_genome(genome), seed) for genome, _, seed, _ in batch]))
+        results = {}
+        waited = time.monotonic()
+        while len(results) < len(batches):
+            try:
+                kind, generation, n, answer = self.answers.get(timeout=1)
+            except queue.Empty:
+                if not self.connected and time.monotonic() - waited > PATIENCE:
+                    print(f"Waiting for workers on {self.address[0]}:{self.address[1]}")
+                    waited = time.monotonic()
+                continue
+            if kind == "error":
+                raise RuntimeError(f"a worker failed to play batch {n}:\n{answer}")
+            # answers left over from a generation that failed are dropped
+            if generation == self.generation:
+                results.setdefault(n, answer)
+        return [fitness for n in range(len(batches)) for fitness in results[n]]
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        for _ in self.threads:
+            self.todo.put(None)
+        # wake accept() up, closing the listener alone does not
+        try:
+            Client(self.local_address(), authkey=self.authkey).close()
+        except (OSError, EOFError, multiprocessing.AuthenticationError):
+            pass
+        self.listener.close()
+        for process in self.processes:
+            process.join(5)
+            if process.is_alive():
+                process.terminate()
@@ -0,0 +1,112 @@
+import numpy as np
+
+# Early termination of hopeless training episodes.
+#
+# A stopped episode does not keep its partial fitness, that would reward stopping early.
+# Its fitness is extrapolated to the full horizon instead, depending on the rule that fired:
+#   out of bounds for M frames in a row: the agent is assumed to stay out, so every remaining
+#       frame costs the game's out of bounds penalty
+#   no new best fitness for N frames: the average reward since the last best carries on for
+#       the remaining frames (it is <= 0, the agent is only losing fitness)
+#   projected fitness below the threshold: the average reward so far carries on, i.e.
+#       fitness * horizon / frames played
+# No rule fires during the first `grace` frames.
+
+
+class EarlyStop:
+    """
+    The stop rules for a run, every rule is off unless set.
+    threshold is a fixed fitness to beat, quantile instead sets it every generation to that quantile
+    of the previous generation's fitness (0.25 cuts anything projected below the bottom quarter).
+    """
+    def __init__(self, patience=None, out_of_bounds=None, threshold=None, quantile=None, grace=50):
+        self.patience = patience
+        self.out_of_bounds = out_of_bounds
+        self.threshold = threshold
+        self.quantile = quantile
+        self.grace = grace
+
+    def start(self, sim):
+        # tracker for one Sim episode
+        return Tracker(self, sim.horizon, sim.penalty)
+
+    def start_batch(self, sim):
+        # tracker for every agent of a BatchSim
+        return BatchTracker(self, sim.n, sim.horizon, sim.penalty)
+
+    def next_generation(self, fitnesses):
+        if self.quantile is not None:
+            self.threshold = float(np.quantile(fitnesses, self.quantile))
+
+
+class Tracker:
+    def __init__(self, rules, horizon, penalty):
+        self.rules = rules
+        self.horizon = horizon
+        self.penalty = penalty
+        self.best = 0
+        self.best_frame = 0
+        self.outside = 0
+        self.projected = None
+
+    # call after every frame with the cumulative fitness. Returns True once the episode should stop
+    def update(self, fitness, frames, out_of_bounds):
+        rules = self.rules
+        if fitness > self.best:
+            self.best, self.best_frame = fitness, frames
+        self.outside = self.outside + 1 if out_of_bounds else 0
+        if frames < rules.grace or frames >= self.horizon:
+            return False
+
+        remaining = self.horizon - frames
+        if rules.out_of_bounds is not None and self.outside >= rules.out_of_bounds:
+            self.projected = fitness + remaining * self.penalty
+        elif rules.patience is not None and frames - self.best_frame >= rules.patience:
+            # a patience of 0 fires on the frame of the best itself, clamped like BatchTracker
+            self.projected = fitness + remaining * ((fitness - self.best) / max(frames - self.best_frame, 1))
+        elif rules.threshold is not None and fitness * self.horizon / frames < rules.threshold:
+            self.projected = fitness * self.horizon / frames
+        return self.projected is not None
+
+
+class BatchTracker:
+    # the same rules as Tracker for n agents at once
+    def __init__(self, rules, n, horizon, penalty):
+        self.rules = rules
+        self.horizon = horizon
+        self.penalty = penalty
+        self.best = np.zeros(n)
+        self.best_frame = np.zeros(n, dtype=int)
+        self.outside = np.zeros(n, dtype=int)
+        self.stopped = np.zeros(n, dtype=bool)
+        self.projected = np.zeros(n)
+
+    # returns the agents that are still running
+    def update(self, fitness, frames, out_of_bounds):
+        rules = self.rules
+        better = fitness > self.best
+        self.best[better] = fitness[better]
+        self.best_frame[better] = frames
+        self.outside = np.where(out_of_bounds, self.outside + 1, 0)
+        if frames < rules.grace or frames >= self.horizon:
+            return ~self.stopped
+
+        remaining = self.horizon - frames
+        projected = np.full(len(fitness), np.nan)
+        if rules.threshold is not None:
+            linear = fitness * self.horizon / frames
+            projected = np.where(linear < rules.threshold, linear, projected)
+        if rules.patience is not None:
+            stale = frames - self.best_frame
+            trend = fitness + remaining * ((fitness - self.best) / np.maximum(stale, 1))
+            projected = np.where(stale >= rules.patience, trend, projected)
+        if rules.out_of_bounds is not None:
+            projected = np.where(self.outside >= rules.out_of_bounds, fitness + remaining * self.penalty, projected)
+
+        new = ~self.stopped & ~np.isnan(projected)
+        self.projected[new] = projected[new]
+        self.stopped |= new
+        return ~self.stopped
+
+    def final(self, fitness):
+        return np.where(self.stopped, self.projected, fitness)
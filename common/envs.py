@@ -0,0 +1,187 @@
+import multiprocessing
+import os
+import numpy as np
+from common import games
+from common.parallel import init_worker
+
+# The games as batched, gym-style environments: N episodes of one game behind reset(seeds) and
+# step(actions), whatever plays them. Observations are (N, inputs) arrays, actions (N, env.actions)
+# arrays of what a network would output. Nothing here needs neat or pygame.
+#   env = VectorEnv("fov")                          one BatchSim in this process
+#   env = AsyncVectorEnv("fov", workers=4)          the N episodes split over 4 worker processes
+#   obs = env.reset(seeds)
+#   obs, reward, done, info = env.step(actions)
+# Every episode of a game lasts the same number of frames, so done is all False until the last step,
+# when it is all True and the next batch starts with reset(). info["deciding"] masks the episodes whose
+# actions the next step reads, the jumping player only decides while it stands on the floor.
+
+
+class VectorEnv:
+    """
+    N episodes of a game played in lockstep by its BatchSim. options go to the BatchSim, e.g. history=30
+    for fov or reward=REWARD.tune(...), and seeds[i] plays the episode Sim(seed=seeds[i]) would.
+    """
+    def __init__(self, game, width=games.WIDTH, height=games.HEIGHT, **options):
+        self.game = game
+        self.width = width
+        self.height = height
+        self.options = options
+        self.batch_sim = games.load(game, "BatchSim").BatchSim
+        self.actions = self.batch_sim.actions
+        self.horizon = self.batch_sim.horizon
+        self.sim = None
+
+    @property
+    def n(self):
+        return 0 if self.sim is None else self.sim.n
+
+    def deciding(self):
+        mask = np.zeros(self.sim.n, dtype=bool)
+        mask[self.sim.deciding()] = True
+        return mask
+
+    def reset(self, seeds):
+        seeds = list(seeds)
+        if not seeds:
+            raise ValueError("reset needs at least one seed")
+        self.sim = self.batch_sim(self.width, self.height, seeds, **self.options)
+        return self.sim.observe()
+
+    def step(self, actions):
+        if self.sim is None or self.sim.done:
+            raise RuntimeError("no episode running, call reset(seeds) first")
+        actions = np.asarray(actions, dtype=float).reshape(self.sim.n, self.actions)
+        reward = self.sim.step(actions)
+        done = np.full(self.sim.n, self.sim.done)
+        return self.sim.observe(), reward, done, {"deciding": self.deciding()}
+
+    def close(self):
+        self.sim = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def work(connection, game, width, height, options):
+    # a worker process of AsyncVectorEnv: a VectorEnv run by the commands coming down the pipe
+    init_worker()
+    env = VectorEnv(game, width, height, **options)
+    while True:
+        command, data = connection.recv()
+        if command == "close":
+            connection.close()
+            return
+        try:
+            connection.send((True, getattr(env, command)(data)))
+        except Exception as e:
+            connection.send((False, e))
+
+
+class AsyncVectorEnv:
+    """
+    VectorEnv with the episodes split evenly over `workers` processes, each stepping its share in its own
+    BatchSim. step() is step_async() and step_wait(), so the caller can work out something else (e.g. the
+    next generation) while the workers step. Gives the same observations and rewards as VectorEnv.
+    """
+    def __init__(self, game, workers=None, width=games.WIDTH, height=games.HEIGHT, **options):
+        self.game = game
+        batch_sim = games.load(game, "BatchSim").BatchSim
+        self.actions = batch_sim.actions
+        self.horizon = batch_sim.horizon
+        self.connections = []
+        self.processes = []
+        for _ in range(workers or os.cpu_count() or 1):
+            parent, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=work, args=(child, game, width, height, options), daemon=True)
+            process.start()
+            child.close()
+            self.connections.append(parent)
+            self.processes.append(process)
+        # (first episode, end) of every worker that got episodes on the last reset
+        self.slices = []
+        self.n = 0
+        self.waiting = False
+
+    def call(self, command, data):
+        # the same command to every busy worker, with its share of data
+        for connection, (start, end) in zip(self.connections, self.slices):
+            connection.send((command, data[start:end]))
+        self.waiting = True
+
+    def gather(self):
+        # every busy worker's reply is read before an error is raised, a reply left in a pipe
+        # would be taken for the answer to the next command
+        self.waiting = False
+        replies = [connection.recv() for connection in self.connections[:len(self.slices)]]
+        for ok, result in replies:
+            if not ok:
+                raise result
+        return [result for _, result in replies]
+
+    def reset(self, seeds):
+        seeds = list(seeds)
+        if not seeds:
+            raise ValueError("reset needs at least one seed")
+        if self.waiting:
+            self.gather()
+        # a BatchSim needs at least one episode, spare workers sit this batch out
+        ends = np.linspace(0, len(seeds), min(len(self.connections), len(seeds)) + 1).astype(int).tolist()
+        self.slices = list(zip(ends, ends[1:]))
+        self.n = len(seeds)
+        self.call("reset", seeds)
+        return np.concatenate(self.gather())
+
+    def step_async(self, actions):
+        if not self.slices:
+            raise RuntimeError("no episode running, call reset(seeds) first")
+        self.call("step", np.asarray(actions, dtype=float).reshape(self.n, self.actions))
+
+    def step_wait(self):
+        results = self.gather()
+        obs, reward, done, deciding = (np.concatenate(parts) for parts in zip(*(
+            (o, r, d, info["deciding"]) for o, r, d, info in results)))
+        return obs, reward, done, {"deciding": deciding}
+
+    def step(self, actions):
+        self.step_async(actions)
+        return self.step_wait()
+
+    def close(self):
+        for connection, process in zip(self.connections, self.processes):
+            if process.is_alive():
+                try:
+                    connection.send(("close", None))
+                except (BrokenPipeError, OSError):
+                    pass
+            process.join(1)
+            if process.is_alive():
+                process.terminate()
+            connection.close()
+        self.connections, self.processes = [], []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def rollout(env, seeds, policy):
+    """
+    Plays one episode per seed and returns every episode's total reward. policy(obs, deciding) maps the
+    (N, inputs) observations to (N, env.actions) actions, rows not deciding are never read. For a
+    population, one NetworkStack (common/compiled.py) with every genome playing `episodes` seeds in a row:
+        rollout(env, seeds, lambda obs, deciding: stack.activate(obs.reshape(stack.n, episodes, -1)).reshape(len(obs), -1))
+    """
+    obs = env.reset(seeds)
+    deciding = np.ones(len(obs), dtype=bool)
+    returns = np.zeros(len(obs))
+    while True:
+        obs, reward, done, info = env.step(policy(obs, deciding))
+        returns += reward
+        deciding = info["deciding"]
+        if done.all():
+            return returns
@@ -0,0 +1,50 @@
+from common import games
+
+# headless episodes played straight on a game's Sim, the only loop for them: training, bench.py and replay
+# logs all play through play(). It never imports the pygame front-end, so training processes start fast
+# and need no display. Game.test plays the same steps in a window
+
+_sims = {}
+
+
+def sim_class(game):
+    # loaded once per process, workers included
+    if game not in _sims:
+        _sims[game] = games.load(game, "Sim").Sim
+    return _sims[game]
+
+
+def play(sim, net, tracker=None, profiler=None, step=None):
+    """
+    One episode of sim played by net, returns its fitness. The jumping sim returns no inputs while the
+    player is in the air. tracker stops a hopeless episode early (common/early_stop.py), profiler times
+    every phase (common/profiler.py), step(inputs, output) replaces sim.step(output), e.g. EpisodeLog.step.
+    """
+    fitness = 0
+    while not sim.done:
+        inputs = sim.observe()
+        if profiler is not None:
+            profiler.lap("observe")
+        output = net.activate(inputs) if inputs is not None else None
+        if profiler is not None:
+            profiler.lap("network")
+        fitness += sim.step(output) if step is None else step(inputs, output)
+        if profiler is not None:
+            profiler.lap("reward")
+        if tracker is not None and not sim.done and tracker.update(fitness, sim.frames, sim.out_of_bounds()):
+            return tracker.projected
+    return fitness
+
+
+def eval_genome(game, genome, config, seed=None, stop=None, profiler=None, **options):
+    # eval_function for ParallelEvaluator, bind the game (and a Profiler) with functools.partial.
+    # options go to the Sim, e.g. history=30 for fov
+    import neat
+    net = neat.nn.FeedForwardNetwork.create(genome, config)
+    sim = sim_class(game)(games.WIDTH, games.HEIGHT, seed, **options)
+    tracker = stop.start(sim) if stop is not None else None
+    if profiler is not None:
+        sim.profiler = profiler
+        profiler.start(genome.key)
+    genome.fitness = play(sim, net, tracker, profiler)
+    return genome.fitness
@@ -0,0 +1,71 @@
+import importlib
+import os
+import sys
+
+# every game lives in its own directory as flat scripts (Game.py, Sim.py, BatchSim.py) that import
+# each other by bare name. These helpers load them from anywhere without the games clashing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GAMES = ("bounds", "fov", "jumping")
+MODULES = ("Game", "Sim", "BatchSim", "main")
+WIDTH, HEIGHT = 500, 500
+
+# per game defaults, taken over from the old main.py scripts
+GENERATIONS = {"bounds": 15, "fov": 20, "jumping": 100}
+CHECKPOINT_EVERY = {"bounds": 2, "fov": 10, "jumping": 2}
+# games whose Game.test can let the mouse move the target
+FOLLOW_MOUSE = ("bounds", "fov")
+# games whose Sim remembers a configurable number of past positions
+HISTORY = ("fov",)
+
+
+def path(game, *parts):
+    if game not in GAMES:
+        raise ValueError(f"unknown game {game!r}, expected one of {', '.join(GAMES)}")
+    return os.path.join(ROOT, game, *parts)
+
+
+def clip(game, name="best"):
+    return os.path.join(ROOT, "clips", f"{game}-{name}.mp4")
+
+
+def log(game, name="best"):
+    # replay logs, see common/replay.py
+    return os.path.join(ROOT, "logs", f"{game}-{name}.npz")
+
+
+def load(game, *names):
+    """
+    Import modules of one game, e.g. load("fov", "Sim", "BatchSim").
+    The bare module names are removed from sys.modules again afterwards, so another game can be loaded next.
+    """
+    saved = {name: sys.modules.pop(name) for name in MODULES if name in sys.modules}
+    sys.path.insert(0, path(game))
+    try:
+        modules = [importlib.import_module(name) for name in names]
+    finally:
+        sys.path.remove(path(game))
+        for name in MODULES:
+            sys.modules.pop(name, None)
+        sys.modules.update(saved)
+    return modules[0] if len(modules) == 1 else modules
+
+
+def config(game, vector_species=True):
+    # vector_species speciates with common/species.py, same species as neat's but faster for big populations.
+    # `python -m common.species` checks that they still agree
+    import neat
+    config = neat.Config(neat.DefaultGenome, neat.DefaultReproduction,
+                         neat.DefaultSpeciesSet, neat.DefaultStagnation,
+                         path(game, "config-feedforward.txt"))
+    if vector_species:
+        from common.species import VectorSpeciesSet
+        # the [DefaultSpeciesSet] section was read above, only the class changes
+        config.species_set_type = VectorSpeciesSet
+    return config
+
+
+def best_genome(game, file=None):
+    import pickle
+    with open(file or path(game, "best.pickle"), "rb") as f:
+        return pickle.load(f)
@@ -0,0 +1,117 @@
+import hashlib
+import multiprocessing
+import os
+import random
+import time
+
+
+def init_worker():
+    # workers only train headless games, so pygame must never look for a display or print its banner
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+
+def episode_seed(seed, generation, key):
+    # stable across processes and runs, unlike hash() of a string
+    if seed is None:
+        return None
+    digest = hashlib.blake2b(f"{seed}:{generation}:{key}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def generation_seeds(seed, generation, genomes, scenarios=None):
+    """
+    The episode seeds of every genome in a generation, one list per genome.
+    Without scenarios every genome gets its own episode. With scenarios=K every genome plays
+    the same K episodes (common random numbers), so genomes are compared on equal terms.
+    """
+    if not scenarios:
+        return [[episode_seed(seed, generation, key)] for key, _ in genomes]
+    shared = [episode_seed(seed, generation, f"scenario-{k}") for k in range(scenarios)]
+    return [shared for _ in genomes]
+
+
+def aggregate(fitnesses):
+    # a genome's fitness over several episodes is the mean, so it keeps the scale of a single episode
+    return sum(fitnesses) / len(fitnesses)
+
+
+class ParallelEvaluator:
+    """
+    Drop-in for neat.ParallelEvaluator that also hands every genome a scenario seed.
+    eval_function(genome, config, seed, stop) runs one headless episode and returns the fitness,
+    stop being the EarlyStop rules or None.
+    Each seed only depends on the run seed, the generation and the genome key, so the
+    fitness is the same no matter how many workers there are (workers=1 runs in-process).
+    seed=None picks a random run seed, kept in self.seed so the run can be replayed.
+    cache is an optional FitnessCache, see common/cache.py.
+    """
+    def __init__(self, eval_function, workers=None, seed=None, chunksize=4, scenarios=None, stop=None,
+                 cache=None, fixed_seeds=False):
+        self.eval_function = eval_function
+        self.workers = workers or os.cpu_count() or 1
+        self.seed = seed if seed is not None else random.SystemRandom().getrandbits(32)
+        self.chunksize = chunksize
+        self.scenarios = scenarios
+        self.stop = stop
+        # a FitnessCache, and whether every generation replays the episodes of the first one
+        self.cache = cache
+        self.fixed_seeds = fixed_seeds
+        self.generation = 0
+        self.pool = None
+        if self.workers > 1:
+            self.pool = multiprocessing.Pool(self.workers, initializer=init_worker)
+
+    def __del__(self):
+        self.close()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def run(self, jobs):
+        # fitness of every (genome, config, seed, stop) job, in order
+        if self.pool is None:
+            return [self.eval_function(*job) for job in jobs]
+        return self.pool.starmap(self.eval_function, jobs, self.chunksize)
+
+    def evaluate(self, genomes, config):
+        seeds = generation_seeds(self.seed, 0 if self.fixed_seeds else self.generation, genomes, self.scenarios)
+        results = [[None] * len(episodes) for episodes in seeds]
+        # only episodes missing from the cache are played, each distinct one once.
+        # owners[n] are the (genome, episode) slots that job n fills in
+        jobs, owners, pending = [], [], {}
+        for i, ((_, genome), episodes) in enumerate(zip(genomes, seeds)):
+            for j, s in enumerate(episodes):
+                key = self.cache.key(genome, s, self.stop) if self.cache is not None else None
+                if key is not None:
+                    if key in pending:
+                        # a clone played earlier in this generation
+                        owners[pending[key]].append((i, j))
+                        self.cache.hits += 1
+                        continue
+                    fitness = self.cache.get(key)
+                    if fitness is not None:
+                        results[i][j] = fitness
+                        continue
+                    pending[key] = len(jobs)
+                owners.append([(i, j)])
+                jobs.append((genome, config, s, self.stop))
+
+        start = time.perf_counter()
+        fitnesses = self.run(jobs)
+        if self.cache is not None:
+            self.cache.timed(time.perf_counter() - start, len(jobs))
+            for key, n in pending.items():
+                self.cache.put(key, fitnesses[n])
+
+        for fitness, slots in zip(fitnesses, owners):
+            for i, j in slots:
+                results[i][j] = fitness
+        for (_, genome), episodes in zip(genomes, results):
+            genome.fitness = aggregate(episodes)
+        if self.stop is not None:
+            self.stop.next_generation([genome.fitness for _, genome in genomes])
+        self.generation += 1
@@ -0,0 +1,147 @@
+import os
+import pickle
+import queue
+import subprocess
+import sys
+import tempfile
+import threading
+import neat
+from common import games
+
+# Work that does not have to finish before the next generation starts: snapshot writes
+# (common/checkpoint.py), video encoding (common/recorder.py), champion pickles and clips.
+# Each Pipeline is one background thread working through a bounded queue, so a slow disk or encoder
+# holds the producer back instead of piling up memory.
+
+
+class Pipeline:
+    """
+    One background thread running jobs in the order they were submitted. submit() blocks while `size`
+    jobs are waiting, or returns False right away with block=False. An error in a job is raised again
+    by the next submit(), wait() or close(), and the jobs queued after it are dropped.
+    """
+    def __init__(self, size=2, name="pipeline"):
+        self.jobs = queue.Queue(size)
+        self.error = None
+        self.thread = threading.Thread(target=self.work, name=name, daemon=True)
+        self.thread.start()
+
+    def work(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                self.jobs.task_done()
+                return
+            function, args = job
+            try:
+                if self.error is None:
+                    function(*args)
+            except BaseException as e:
+                self.error = e
+            self.jobs.task_done()
+
+    def check(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def submit(self, function, *args, block=True):
+        self.check()
+        if not self.thread.is_alive():
+            raise RuntimeError("pipeline is closed")
+        try:
+            self.jobs.put((function, args), block)
+        except queue.Full:
+            return False
+        return True
+
+    def wait(self):
+        # until every submitted job is done
+        self.jobs.join()
+        self.check()
+
+    def close(self):
+        if self.thread.is_alive():
+            self.jobs.put(None)
+            self.thread.join()
+        self.check()
+
+
+def replace(path, data):
+    # written to a temporary file first, so a crash never leaves half a file
+    with open(path + ".tmp", "wb") as f:
+        f.write(data)
+    os.replace(path + ".tmp", path)
+
+
+class ChampionReporter(neat.reporting.BaseReporter):
+    """
+    Saves every new best genome of a run as soon as it is found, so a killed run still leaves its best:
+    pickled to path in the background. With clips it is also recorded to clips/<game>-generation-N.mp4
+    by a `run.py record` process, a champion found while the last clip is still being recorded gets no clip.
+    With logs one headless episode of it is kept as logs/<game>-generation-N.npz (common/replay.py),
+    on the same episode as the clip. best is the champion to beat, e.g. the best genome of a resumed
+    population. options are extra run.py arguments for the recording, e.g. ["--history", "60"], and
+    sim_options the same as Sim arguments for the log.
+    """
+    def __init__(self, path, game, best=None, options=(), clips=False, logs=False, sim_options=None):
+        self.path = path
+        self.game = game
+        self.options = list(options)
+        self.sim_options = sim_options or {}
+        self.best = None if best is None else best.fitness
+        self.generation = None
+        self.files = Pipeline(2, "champion")
+        self.clips = Pipeline(1, "clips") if clips else None
+        # loaded here, games.load is not safe to call from the pipeline thread
+        self.sim = games.load(game, "Sim").Sim if logs else None
+
+    def start_generation(self, generation):
+        self.generation = generation
+
+    def post_evaluate(self, config, population, species, best_genome):
+        # the same test as neat.Population, so the last champion saved is the genome the run returns
+        if self.best is not None and best_genome.fitness <= self.best:
+            return
+        self.best = best_genome.fitness
+        data = pickle.dumps(best_genome, protocol=pickle.HIGHEST_PROTOCOL)
+        self.files.submit(replace, self.path, data)
+        if self.sim is not None:
+            self.files.submit(self.log, data, config, self.generation)
+        if self.clips is not None and not self.clips.submit(self.record, data, self.generation, block=False):
+            print(f"No clip of generation {self.generation}, still recording an older champion")
+
+    def record(self, data, generation):
+        # a separate process with a dummy video driver, so drawing and encoding never hold up training.
+        # Nobody watches it, so it steps as fast as it can
+        clip = games.clip(self.game, f"generation-{generation}")
+        os.makedirs(os.path.dirname(clip), exist_ok=True)
+        with tempfile.NamedTemporaryFile(suffix=".pickle", delete=False) as f:
+            f.write(data)
+        try:
+            env = dict(os.environ, SDL_VIDEODRIVER="dummy", SDL_AUDIODRIVER="dummy")
+            done = subprocess.run([sys.executable, os.path.join(games.ROOT, "run.py"), self.game, "record",
+                                   "--genome", f.name, "--clip", clip, "--seed", str(generation),
+                                   "--speed", "0", *self.options],
+                                  env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        finally:
+            os.remove(f.name)
+        if done.returncode != 0:
+            print(f"Recording {clip} failed:\n{done.stderr.strip()}")
+        else:
+            print("Recorded", clip)
+
+    def log(self, data, config, generation):
+        from common.replay import log_episode
+        genome = pickle.loads(data)
+        path = games.log(self.game, f"generation-{generation}")
+        # the options needed to draw the log again, a tuned reward is kept in the log anyway
+        options = {name: value for name, value in self.sim_options.items() if name != "reward"}
+        sim = self.sim(games.WIDTH, games.HEIGHT, generation, **self.sim_options)
+        log_episode(sim, neat.nn.FeedForwardNetwork.create(genome, config), path, self.game, generation, options,
+                    genome=genome.key, generation=generation)
+
+    def close(self):
+        self.files.close()
+        if self.clips is not None:
+            self.clips.close()
@@ -0,0 +1,87 @@
+import collections
+import time
+import neat
+
+# Opt-in timing of the phases of a frame. The game calls lap(phase) at the end of every phase and the
+# time since the previous lap goes to that phase, so a frame costs one clock read per phase.
+# Without a profiler the games skip every lap.
+#   headless: observe, network, physics, reward
+#   window:   events, observe, network, physics, reward, draw, flip, record, tick
+# physics is the movement inside Sim.step, reward the rest of it (fov's revisit check,
+# jumping's obstacle bookkeeping).
+
+clock = time.perf_counter
+
+
+class Profiler:
+    def __init__(self):
+        self.totals = collections.defaultdict(float)
+        self.counts = collections.defaultdict(int)
+        # log2 buckets of nanoseconds per lap, bucket b holds laps shorter than 2**b ns
+        self.histograms = collections.defaultdict(lambda: [0] * 64)
+        # phase totals of every genome since the last reset
+        self.genomes = {}
+        self.current = None
+        self.last = clock()
+
+    def start(self, key=None):
+        # call before each episode. key collects the episode's times per genome
+        if key is not None:
+            self.current = self.genomes.setdefault(key, collections.defaultdict(float))
+        self.last = clock()
+
+    def lap(self, phase):
+        now = clock()
+        seconds = now - self.last
+        self.last = now
+        self.totals[phase] += seconds
+        self.counts[phase] += 1
+        self.histograms[phase][min(int(seconds * 1e9).bit_length(), 63)] += 1
+        if self.current is not None:
+            self.current[phase] += seconds
+
+    def percentile(self, phase, q):
+        # upper bound of the bucket holding the q-th percentile, in seconds
+        counts = self.histograms[phase]
+        target = q * sum(counts)
+        seen = 0
+        for bucket, count in enumerate(counts):
+            seen += count
+            if count and seen >= target:
+                return 2 ** bucket / 1e9
+        return 0.0
+
+    def summary(self):
+        total = sum(self.totals.values())
+        lines = [f"{'phase':>8} {'total s':>9} {'share':>6} {'mean us':>8} {'p50 us':>8} {'p99 us':>8}"]
+        for phase, seconds in sorted(self.totals.items(), key=lambda item: -item[1]):
+            lines.append(f"{phase:>8} {seconds:9.3f} {seconds / total * 100:5.1f}% "
+                         f"{seconds / self.counts[phase] * 1e6:8.1f} "
+                         f"{self.percentile(phase, 0.5) * 1e6:8.1f} {self.percentile(phase, 0.99) * 1e6:8.1f}")
+        return "\n".join(lines)
+
+    def reset(self):
+        self.totals.clear()
+        self.counts.clear()
+        self.histograms.clear()
+        self.genomes = {}
+        self.current = None
+
+
+class ProfileReporter(neat.reporting.BaseReporter):
+    # prints where a generation's time went and the slowest genomes, then starts over
+    def __init__(self, profiler, slowest=3):
+        self.profiler = profiler
+        self.slowest = slowest
+
+    def post_evaluate(self, config, population, species, best_genome):
+        profiler = self.profiler
+        if not profiler.totals:
+            return
+        print("Frame profile:")
+        print(profiler.summary())
+        ranked = sorted(profiler.genomes.items(), key=lambda item: -sum(item[1].values()))
+        for key, phases in ranked[:self.slowest]:
+            parts = ", ".join(f"{phase} {seconds:.3f}" for phase, seconds in sorted(phases.items(), key=lambda item: -item[1]))
+            print(f"  genome {key}: {sum(phases.values()):.3f} sec ({parts})")
+        profiler.reset()
@@ -0,0 +1,63 @@
+import numpy as np
+from common.pipeline import Pipeline
+
+
+class Recorder:
+    """
+    Streams frames straight into the video encoder as they are produced, so memory stays at about
+    one frame no matter how long the replay is. skip keeps every skip-th frame (the video plays at
+    fps / skip so it keeps its length) and scale shrinks frames by that integer factor.
+    Frames are shrunk and encoded on a background thread, at most `queue` of them wait for it.
+    """
+    def __init__(self, path, fps=120, skip=1, scale=1, queue=8):
+        self.path = path
+        self.fps = fps
+        self.skip = skip
+        self.scale = scale
+        self.queue = queue
+        self.writer = None
+        self.encoder = None
+        self.frames = 0
+
+    def downscale(self, frame):
+        s = self.scale
+        # average s x s blocks. h264 needs even sizes, so crop to a multiple of 2 * s
+        h, w = frame.shape[0] // (2 * s) * 2 * s, frame.shape[1] // (2 * s) * 2 * s
+        frame = frame[:h, :w]
+        if s > 1:
+            frame = frame.reshape(h // s, s, w // s, s, 3).mean(axis=(1, 3)).astype(np.uint8)
+        return frame
+
+    def add(self, frame):
+        # frame is an (height, width, 3) uint8 array the caller does not touch again
+        if self.frames % self.skip == 0:
+            if self.encoder is None:
+                self.encoder = Pipeline(self.queue, "recorder")
+            self.encoder.submit(self.write, frame)
+        self.frames += 1
+
+    def write(self, frame):
+        # runs on the encoder thread
+        frame = self.downscale(frame)
+        if self.writer is None:
+            # moviepy is only imported once something is actually recorded
+            from moviepy.video.io.ffmpeg_writer import FFMPEG_VideoWriter
+            self.writer = FFMPEG_VideoWriter(self.path, (frame.shape[1], frame.shape[0]), self.fps / self.skip)
+        self.writer.write_frame(frame)
+
+    def close(self):
+        # finish the frames still queued, and raise if encoding one of them failed
+        encoder, self.encoder = self.encoder, None
+        try:
+            if encoder is not None:
+                encoder.close()
+        finally:
+            if self.writer is not None:
+                self.writer.close()
+                self.writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
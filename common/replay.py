@@ -0,0 +1,124 @@
+import json
+import os
+import numpy as np
+from common import episode, games
+
+# Compact replay logs: an episode as one row per frame instead of video frames. A log keeps what the
+# Sim looked like after every step (its snapshot(), e.g. player and target positions, the jumping
+# player's vy and obstacle), what the network saw and answered, the reward and what every reward term
+# added. Saved as a compressed .npz of columns, a few kilobytes per episode, so every champion of a
+# run can be kept. frames() draws a log again with the game's own Game.draw, no simulation needed.
+#   python run.py fov test --log logs/fov-best.npz          log the episode while watching it
+#   python run.py bounds train --logs                       a log per new best genome, in logs/
+#   python run.py fov replay --log logs/fov-best.npz        render it to clips/fov-replay.mp4
+#   columns = load("logs/fov-best.npz"); columns["inputs"], columns["term_closer"], columns.meta
+# Columns: state_<name> for every snapshot field, inputs and outputs (NaN rows where the jumping network
+# was not asked), reward and term_<name> for every reward term.
+
+
+class EpisodeLog:
+    """
+    Collects the rows of one episode of `sim`, a Sim of `game` made with `seed` and the Sim options
+    `options` (the ones frames() needs to draw it again, like history, not the reward).
+    Step the sim through step() instead of sim.step(). meta is anything else to keep, e.g. the genome key.
+    """
+    def __init__(self, sim, game, seed=None, options=None, **meta):
+        self.sim = sim
+        self.meta = dict(meta, game=game, seed=seed, options=options or {},
+                         reward={term.name: term.value for term in sim.reward.terms})
+        self.inputs = []
+        self.outputs = []
+        self.rewards = []
+        self.terms = {name: [] for name in sim.reward.names}
+        self.states = {}
+
+    def step(self, inputs, output):
+        # sim.step(output) that keeps the row. A sim adding up its terms (sim.contributions) still does
+        sim = self.sim
+        totals = sim.contributions
+        sim.contributions = record = sim.reward.zeros()
+        try:
+            reward = sim.step(output)
+        finally:
+            sim.contributions = totals
+        if totals is not None:
+            for name, value in record.items():
+                totals[name] += value
+        self.inputs.append(inputs)
+        self.outputs.append(output)
+        self.rewards.append(reward)
+        for name, value in record.items():
+            self.terms[name].append(value)
+        for name, value in sim.snapshot().items():
+            self.states.setdefault(name, []).append(value)
+        return reward
+
+    @staticmethod
+    def matrix(rows):
+        # rows of numbers as a float array, None rows become NaN
+        width = max((len(row) for row in rows if row is not None), default=0)
+        array = np.full((len(rows), width), np.nan)
+        for i, row in enumerate(rows):
+            if row is not None:
+                array[i] = row
+        return array
+
+    def columns(self):
+        columns = {"inputs": self.matrix(self.inputs), "outputs": self.matrix(self.outputs),
+                   "reward": np.array(self.rewards, dtype=float)}
+        columns.update((f"term_{name}", np.array(values, dtype=float)) for name, values in self.terms.items())
+        columns.update((f"state_{name}", np.array(values)) for name, values in self.states.items())
+        return columns
+
+    def save(self, path, **meta):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        meta = dict(self.meta, **meta, frames=len(self.rewards), fitness=float(sum(self.rewards)))
+        np.savez_compressed(path, meta=np.array(json.dumps(meta)), **self.columns())
+
+
+class Log(dict):
+    # the columns of a saved log, and its meta data
+    meta = None
+
+    @property
+    def frames(self):
+        return self.meta["frames"]
+
+    def row(self, i):
+        # snapshot() of frame i
+        return {name[6:]: column[i].item() for name, column in self.items() if name.startswith("state_")}
+
+
+def load(path):
+    with np.load(path) as f:
+        log = Log((name, f[name]) for name in f.files if name != "meta")
+        log.meta = json.loads(f["meta"].item())
+    return log
+
+
+def log_episode(sim, net, path, game, seed=None, options=None, **meta):
+    # one headless episode of a neat network, logged to path. Returns the fitness
+    log = EpisodeLog(sim, game, seed, options, **meta)
+    episode.play(sim, net, step=log.step)
+    log.save(path)
+    return sum(log.rewards)
+
+
+def frames(log, width=games.WIDTH, height=games.HEIGHT):
+    """
+    Draws every frame of a log (a path or load()ed) the way Game.test shows it, as (height, width, 3)
+    uint8 arrays, one after the other. Only needs pygame, not a window.
+    """
+    import pygame as pg
+    if isinstance(log, str):
+        log = load(log)
+    Game = games.load(log.meta["game"], "Game").Game
+    pg.init()
+    screen = pg.Surface((width, height))
+    g = Game(screen, width, height, log.meta["seed"], **log.meta["options"])
+    for i in range(log.frames):
+        g.sim.restore(log.row(i))
+        g.sim.frames = i + 1
+        screen.fill((0, 0, 0))
+        g.draw()
+        yield pg.surfarray.array3d(screen).swapaxes(0, 1)
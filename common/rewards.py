@@ -0,0 +1,112 @@
+import numpy as np
+
+# Declarative reward shaping. Every game's Sim.py lists its rules as a Reward of Terms; the Sim and
+# BatchSim only work out what happened in a frame (a state dict of events) and the Reward turns that
+# into fitness, one agent at a time (Sim) or for a whole batch of agents at once (BatchSim).
+#   REWARD = Reward(
+#       Term("out_of_bounds", OUT_OF_BOUNDS, final=True),
+#       Term("closer", 0.15),
+#   )
+#   Sim(width, height, seed, reward=REWARD.tune(closer=0.2))    run.py --reward closer=0.2
+# Set sim.contributions = sim.reward.zeros(n) before an episode to get every term's share of the fitness.
+
+
+class Term:
+    """
+    One rule of a reward: `value` for every time the event `name` happened this frame. The state entry
+    is a bool or a count per agent. A value that happens k times is added k times in a row, so the floats
+    come out exactly like a loop of `reward += value`. A final term ends the frame's reward for the agents
+    it matched, like an early return.
+    """
+    def __init__(self, name, value, final=False):
+        self.name = name
+        self.value = value
+        self.final = final
+        # repeated(k) for every k seen so far, and the same as an array
+        self.table = [0, value]
+        self.array = np.array(self.table, dtype=float)
+
+    def repeated(self, k):
+        if len(self.table) <= k:
+            while len(self.table) <= k:
+                self.table.append(self.table[-1] + self.value)
+            self.array = np.array(self.table, dtype=float)
+        return self.table[k]
+
+    def lookup(self, counts):
+        # repeated() for an array of counts
+        try:
+            return self.array[counts]
+        except IndexError:
+            self.repeated(int(counts.max()))
+            return self.array[counts]
+
+
+class Reward:
+    def __init__(self, *terms):
+        self.terms = terms
+        self.names = [term.name for term in terms]
+        self.values = np.array([term.value for term in terms], dtype=float)[:, None]
+        self.finals = [i for i, term in enumerate(terms) if term.final]
+
+    def __getitem__(self, name):
+        return self.terms[self.names.index(name)]
+
+    def tune(self, **values):
+        # a copy with some term values replaced
+        unknown = set(values) - set(self.names)
+        if unknown:
+            raise ValueError(f"unknown reward terms {', '.join(sorted(unknown))}, expected some of {', '.join(self.names)}")
+        return Reward(*(Term(t.name, values.get(t.name, t.value), t.final) for t in self.terms))
+
+    def zeros(self, n=None):
+        # an empty record of contributions, for one agent or n
+        return {name: 0 if n is None else np.zeros(n) for name in self.names}
+
+    def one(self, state, record=None):
+        # reward of one agent. state maps term names to bools or counts
+        reward = 0
+        for term in self.terms:
+            events = state[term.name]
+            if events:
+                table = term.table
+                contribution = table[events] if events < len(table) else term.repeated(events)
+                reward += contribution
+                if record is not None:
+                    record[term.name] += contribution
+                if term.final:
+                    break
+        return reward
+
+    def batch(self, state, n, record=None):
+        # rewards of n agents. state maps term names to arrays of bools or counts.
+        # Every term is one row, so a frame costs the same few numpy calls however many terms there are
+        rows = [np.asarray(state[name]) for name in self.names]
+        events = np.array(rows)
+        if self.finals:
+            # a final term clears the events of every later term for the agents it matched
+            counted = np.ones(events.shape, dtype=bool)
+            for i in self.finals:
+                counted[i + 1:] &= events[i] == 0
+            events = events * counted
+        contributions = events * self.values
+        for i, row in enumerate(rows):
+            # counts add the value k times in a row, bools are exact as a product
+            if row.dtype != bool:
+                contributions[i] = self.terms[i].lookup(events[i])
+        if record is not None:
+            for name, contribution in zip(self.names, contributions):
+                record[name] += contribution
+        # summed along the terms one row after the other, in the same order as one()
+        return np.add.reduce(contributions, axis=0)
+
+    def summary(self, record, episodes=1):
+        # what every term added to the fitness, in total and per episode
+        record = {name: float(np.sum(total)) for name, total in record.items()}
+        magnitude = sum(abs(total) for total in record.values()) or 1
+        lines = [f"{'term':>16} {'value':>8} {'total':>12} {'per episode':>12} {'share':>6}"]
+        for term in self.terms:
+            total = record[term.name]
+            lines.append(f"{term.name:>16} {term.value:8g} {total:12.2f} {total / episodes:12.2f} "
+                         f"{abs(total) / magnitude * 100:5.1f}%")
+        return "\n".join(lines)
@@ -0,0 +1,82 @@
+import time
+
+# Fixed timestep pacing for a game in a window. The simulation advances in whole steps, `speed` of them
+# per second of wall clock, however long a frame takes to draw, and the screen is drawn `render_rate`
+# times a second in between. alpha says how far the clock is into the next step, so moving things can be
+# drawn between where they were and where they are. Headless games never use it: training runs every
+# step right after the other.
+#   scheduler = Scheduler(100)
+#   while running:
+#       for _ in scheduler.due():
+#           step()
+#       draw(scheduler.alpha)
+#       scheduler.wait()
+
+# past this many steps per second faster() switches to as fast as possible
+MAX_SPEED = 10000
+# wall clock caught up at most at once, so a stalled window does not come back with a burst of steps
+MAX_LAG = 0.25
+
+
+def interpolate(previous, current, alpha):
+    # a rect (or any tuple of numbers) alpha of the way from previous to current
+    if previous is None:
+        return current
+    return tuple(p + (c - p) * alpha for p, c in zip(previous, current))
+
+
+class Scheduler:
+    """
+    speed is simulation steps per second, 0 runs as many steps as fit into a frame.
+    lockstep draws a frame after every step instead, still `speed` of them per second, for recordings
+    that need every step on screen.
+    """
+    def __init__(self, speed=120, render_rate=60, lockstep=False):
+        self.speed = speed
+        self.render_rate = render_rate
+        self.lockstep = lockstep
+        self.alpha = 1.0
+        self.lag = 0.0
+        self.last = None
+        self.next_frame = None
+
+    def due(self):
+        # yields once for every step to run before the next frame is drawn
+        now = time.perf_counter()
+        if self.last is None:
+            self.last = self.next_frame = now
+        if self.lockstep or not self.speed:
+            self.alpha = 1.0
+            yield
+            if not self.lockstep:
+                end = now + 1 / self.render_rate
+                while time.perf_counter() < end:
+                    yield
+            self.last = time.perf_counter()
+            self.lag = 0.0
+            return
+        self.lag = min(self.lag + now - self.last, MAX_LAG)
+        self.last = now
+        step = 1 / self.speed
+        while self.lag >= step:
+            self.lag -= step
+            yield
+        self.alpha = self.lag / step
+
+    def wait(self):
+        # sleeps until the next frame is due. A frame that ran late moves the following ones back
+        if self.lockstep:
+            interval = 1 / self.speed if self.speed else 0
+        else:
+            # as fast as possible spent its frame in due() already
+            interval = 1 / self.render_rate if self.speed else 0
+        now = time.perf_counter()
+        self.next_frame = max(self.next_frame + interval, now)
+        if self.next_frame > now:
+            time.sleep(self.next_frame - now)
+
+    def faster(self):
+        self.speed = 0 if not self.speed or self.speed * 2 > MAX_SPEED else self.speed * 2
+
+    def slower(self):
+        self.speed = MAX_SPEED if not self.speed else max(self.speed // 2, 1)
@@ -0,0 +1,14 @@
+import math
+
+# pygame rules every Sim and BatchSim plays by without importing pygame, kept in one place so the
+# games (and a Sim and the pygame front-end drawing it) can not drift apart on them
+
+
+def rect_round(v):
+    # pygame rounds half away from zero when a float is stored in a Rect
+    return int(math.floor(abs(v) + 0.5)) * (1 if v >= 0 else -1)
+
+
+def overlap(ax, ay, aw, ah, bx, by, bw, bh):
+    # same test as pg.Rect.colliderect
+    return ax < bx + bw and bx < ax + aw and ay < by + bh and by < ay + ah
@@ -0,0 +1,327 @@
+import argparse
+import random
+import neat
+import numpy as np
+from neat.species import DefaultSpeciesSet, Species
+
+# Speciation with vectorized genome distances, for large populations.
+#
+# DefaultSpeciesSet walks the genes of every genome against every species representative in Python.
+# VectorSpeciesSet keeps every genome as arrays of its sorted gene keys and gene attributes, packs the
+# population into flat arrays and computes the distance from a representative to every genome
+# in one go. It makes the same choices as DefaultSpeciesSet, in the same order: where a numpy
+# distance is within EPS of the threshold or of another candidate, the tie is settled with neat's
+# own genome.distance, computed in the direction neat would have computed it.
+#
+# It reads the [DefaultSpeciesSet] section of a config, so swap it in after parsing:
+#   config.species_set_type = VectorSpeciesSet   (common.games.config does this)
+# check() runs both species sets side by side and stops at the first generation where they disagree.
+# Run it after touching anything here:
+#   python -m common.species                     every game, a few seeds
+#   python -m common.species fov --seeds 7 --generations 50
+
+# numpy sums genes in another order than neat, which only moves the last few bits
+EPS = 1e-9
+
+
+def connection_code(key):
+    # (input, output) as one sortable int64, node keys stay far below 2**31
+    return key[0] * 2 ** 32 + key[1]
+
+
+class VectorSpeciesSet(DefaultSpeciesSet):
+    def __init__(self, config, reporters):
+        super().__init__(config, reporters)
+        # genes never change once a genome exists, so every genome is only encoded once.
+        # key -> (node keys, node bias/response/activation/aggregation, connection codes, weight/enabled)
+        self.encodings = {}
+        self.strings = {}
+
+    def __getstate__(self):
+        # encodings are rebuilt on demand, no need to pickle them
+        state = dict(self.__dict__)
+        state["encodings"] = {}
+        return state
+
+    def encode(self, genomes):
+        # encode the genomes that are not cached yet, with one numpy call per array for all of them
+        new = [g for g in genomes if g.key not in self.encodings]
+        if not new:
+            return
+        strings = self.strings
+        node_keys, node_values, node_counts = [], [], []
+        connection_keys, connection_values, connection_counts = [], [], []
+        for g in new:
+            keys = sorted(g.nodes)
+            node_keys += keys
+            for k in keys:
+                n = g.nodes[k]
+                node_values.append((n.bias, n.response,
+                                    strings.setdefault(n.activation, len(strings)),
+                                    strings.setdefault(n.aggregation, len(strings))))
+            node_counts.append(len(keys))
+            codes = sorted((connection_code(k), c) for k, c in g.connections.items())
+            connection_keys += [code for code, _ in codes]
+            connection_values += [(c.weight, c.enabled) for _, c in codes]
+            connection_counts.append(len(codes))
+
+        def split(array, counts):
+            # views into one array, np.split is slow for thousands of pieces
+            ends = np.cumsum(counts).tolist()
+            return [array[end - count:end] for count, end in zip(counts, ends)]
+
+        arrays = (
+            split(np.array(node_keys, dtype=np.int64), node_counts),
+            split(np.array(node_values, dtype=float).reshape(-1, 4), node_counts),
+            split(np.array(connection_keys, dtype=np.int64), connection_counts),
+            split(np.array(connection_values, dtype=float).reshape(-1, 2), connection_counts),
+        )
+        for g, encoding in zip(new, zip(*arrays)):
+            self.encodings[g.key] = encoding
+
+    def pack(self, genomes):
+        # the encodings of the population as flat arrays, with the owning row of every gene
+        self.encode(genomes)
+        encodings = [self.encodings[g.key] for g in genomes]
+        node_counts = np.array([len(e[0]) for e in encodings])
+        connection_counts = np.array([len(e[2]) for e in encodings])
+        rows = np.arange(len(genomes))
+        return {
+            "n": len(genomes),
+            "nodes": (np.concatenate([e[0] for e in encodings]), np.repeat(rows, node_counts), node_counts,
+                      np.concatenate([e[1] for e in encodings])),
+            "connections": (np.concatenate([e[2] for e in encodings]), np.repeat(rows, connection_counts),
+                            connection_counts, np.concatenate([e[3] for e in encodings])),
+        }
+
+    @staticmethod
+    def part(genes, rep_keys, rep_values, n, genome_config):
+        # node or connection term of genome.distance, for every packed genome against one representative.
+        # The first attribute column (two for nodes) is compared by absolute difference, the rest by equality
+        keys, owner, counts, values = genes
+        if len(rep_keys):
+            pos = np.minimum(np.searchsorted(rep_keys, keys), len(rep_keys) - 1)
+            match = rep_keys[pos] == keys
+        else:
+            pos = np.zeros(len(keys), dtype=int)
+            match = np.zeros(len(keys), dtype=bool)
+        diff = values[match] - rep_values[pos[match]]
+        floats = 2 if values.shape[1] == 4 else 1
+        gene_distance = np.abs(diff[:, :floats]).sum(axis=1) + (diff[:, floats:] != 0).sum(axis=1)
+
+        homologous = np.bincount(owner[match], minlength=n)
+        summed = np.bincount(owner[match], weights=gene_distance, minlength=n)
+        disjoint = (counts - homologous) + (len(rep_keys) - homologous)
+        largest = np.maximum(counts, len(rep_keys))
+        distance = (summed * genome_config.compatibility_weight_coefficient +
+                    genome_config.compatibility_disjoint_coefficient * disjoint) / np.maximum(largest, 1)
+        return np.where(largest > 0, distance, 0.0)
+
+    def distances(self, rep, pack, genome_config):
+        # genome distance from rep to every packed genome
+        self.encode([rep])
+        rep_nodes, rep_node_values, rep_connections, rep_connection_values = self.encodings[rep.key]
+        n = pack["n"]
+        return (self.part(pack["nodes"], rep_nodes, rep_node_values, n, genome_config) +
+                self.part(pack["connections"], rep_connections, rep_connection_values, n, genome_config))
+
+    def speciate(self, config, population, generation):
+        assert isinstance(population, dict)
+        threshold = self.species_set_config.compatibility_threshold
+        genome_config = config.genome_config
+        keep = set(population) | {s.representative.key for s in self.species.values()}
+        self.encodings = {k: e for k, e in self.encodings.items() if k in keep}
+        # genome keys in order, and the row of every genome in the packed arrays
+        genomes = sorted(population.values(), key=lambda g: g.key)
+        keys = np.array([g.key for g in genomes])
+        rows = {gid: i for i, gid in enumerate(keys.tolist())}
+        pack = self.pack(genomes)
+
+        # neat caches a pair's distance the first time either order is asked for. Only an old representative
+        # that is still in the population (an elite) can meet a genome twice, so for those the order they were
+        # asked in and the genomes they were asked against are kept. Every other pair is asked once
+        asked_by = {}
+
+        def first_order(a, b):
+            # (a, b) or (b, a), whichever neat asked first. None if neither was asked while finding representatives
+            orders = []
+            if a.key in asked_by and b.key in asked_by[a.key][1]:
+                orders.append((asked_by[a.key][0], a, b))
+            if b.key in asked_by and a.key in asked_by[b.key][1]:
+                orders.append((asked_by[b.key][0], b, a))
+            return min(orders, key=lambda o: o[0])[1:] if orders else None
+
+        def exact(a, b):
+            x, y = first_order(a, b) or (a, b)
+            return x.distance(y, genome_config)
+
+        def closest(candidates, distance):
+            # item of the first (distance, item, other genome) candidate with the smallest distance, like min().
+            # Near ties are settled with distance(other), the exact one
+            if len(candidates) == 1:
+                return candidates[0][1]
+            smallest = min(c[0] for c in candidates)
+            near = [c for c in candidates if c[0] <= smallest + EPS]
+            if len(near) > 1:
+                near = [(distance(other), item, other) for _, item, other in near]
+            return min(near, key=lambda c: c[0])[1]
+
+        # every distinct distance asked for, and the number of genomes asked against themselves, for the report
+        asked = []
+        same = 0
+
+        # Find the best representatives for each existing species. Built from the keys like neat does:
+        # a set made from the dict itself is sized differently and pops the genomes in another order
+        unspeciated = set(population.keys())
+        new_representatives = {}
+        new_members = {}
+        for sid, s in self.species.items():
+            rep = s.representative
+            order = list(unspeciated)
+            d = self.distances(rep, pack, genome_config)[keys.searchsorted(np.array(order))]
+            if rep.key in population:
+                # pairs with elites that were asked before, the other way round, are not new
+                repeated = [i for i, gid in enumerate(order) if gid in asked_by and rep.key in asked_by[gid][1]]
+                if rep.key in unspeciated:
+                    repeated.append(order.index(rep.key))
+                    same += 1
+                asked.append(np.delete(d, repeated))
+                asked_by[rep.key] = (len(asked_by), set(unspeciated))
+            else:
+                asked.append(d)
+
+            smallest = d.min()
+            near = np.flatnonzero(d <= smallest + EPS)
+            new_rid = closest([(d[i], order[i], population[order[i]]) for i in near], lambda other: exact(rep, other))
+            new_representatives[sid] = new_rid
+            new_members[sid] = [new_rid]
+            unspeciated.remove(new_rid)
+
+        # Partition population into species based on genetic similarity.
+        reps = [(sid, population[rid], self.distances(population[rid], pack, genome_config).tolist())
+                for sid, rid in new_representatives.items()]
+        later = []
+        while unspeciated:
+            gid = unspeciated.pop()
+            g = population[gid]
+            row = rows[gid]
+            candidates = []
+            for sid, rep, distances in reps:
+                d = distances[row]
+                if not (rep.key in asked_by or gid in asked_by) or first_order(rep, g) is None:
+                    later.append(d)
+                if abs(d - threshold) <= EPS:
+                    d = exact(rep, g)
+                if d < threshold:
+                    candidates.append((d, sid, rep))
+
+            if candidates:
+                sid = closest(candidates, lambda other: exact(other, g))
+                new_members[sid].append(gid)
+            else:
+                sid = next(self.indexer)
+                new_representatives[sid] = gid
+                new_members[sid] = [gid]
+                reps.append((sid, g, self.distances(g, pack, genome_config).tolist()))
+        asked.append(np.array(later))
+
+        # Update species collection based on new speciation.
+        self.genome_to_species = {}
+        for sid, rid in new_representatives.items():
+            s = self.species.get(sid)
+            if s is None:
+                s = Species(sid, generation)
+                self.species[sid] = s
+
+            members = new_members[sid]
+            for gid in members:
+                self.genome_to_species[gid] = sid
+
+            member_dict = dict((gid, population[gid]) for gid in members)
+            s.update(population[rid], member_dict)
+
+        # neat's cache holds every pair twice and a genome's distance to itself once
+        asked = np.concatenate(asked)
+        count = 2 * len(asked) + same
+        gdmean = 2 * asked.sum() / count
+        gdstdev = np.sqrt((2 * ((asked - gdmean) ** 2).sum() + same * gdmean ** 2) / count)
+        self.reporters.info(
+            'Mean genetic distance {0:.3f}, standard deviation {1:.3f}'.format(gdmean, gdstdev))
+
+
+class SpeciesRecorder(neat.reporting.BaseReporter):
+    # the species every generation ends with, and what speciation reported on the way. Members are kept
+    # in the order they were put in their species, which is the order speciate() took them in
+    def __init__(self):
+        self.generations = []
+        self.messages = []
+
+    def info(self, msg):
+        self.messages.append(msg)
+
+    def end_generation(self, config, population, species_set):
+        species = {sid: list(s.members) for sid, s in species_set.species.items()}
+        representatives = {sid: s.representative.key for sid, s in species_set.species.items()}
+        self.generations.append((species, representatives, self.messages))
+        self.messages = []
+
+
+def record(config, species_set, seed, generations):
+    # a run with species_set whose fitness draws from random, so populations (and their keys) get shuffled
+    config.species_set_type = species_set
+    random.seed(seed)
+    population = neat.Population(config)
+    recorder = SpeciesRecorder()
+    population.add_reporter(recorder)
+
+    def fitness(genomes, config):
+        for _, genome in genomes:
+            genome.fitness = random.random()
+
+    try:
+        population.run(fitness, generations)
+    except neat.CompleteExtinctionException:
+        pass
+    return recorder.generations
+
+
+def check(game, seed=7, generations=20):
+    """
+    Speciates the same run with DefaultSpeciesSet and VectorSpeciesSet. Returns None when both made the
+    same species, with the same representatives and distance report, every generation, otherwise
+    (generation, what differs).
+    """
+    from common import games
+    config = games.config(game, vector_species=False)
+    expected = record(config, DefaultSpeciesSet, seed, generations)
+    got = record(config, VectorSpeciesSet, seed, generations)
+    for generation, (a, b) in enumerate(zip(expected, got)):
+        for what, x, y in zip(("species", "representatives", "report"), a, b):
+            if x != y:
+                return generation, what
+    if len(expected) != len(got):
+        return min(len(expected), len(got)), "generations"
+    return None
+
+
+def main():
+    from common import games
+    parser = argparse.ArgumentParser(description="Check that VectorSpeciesSet makes the species DefaultSpeciesSet makes")
+    parser.add_argument("games", nargs="*", help=f"any of {', '.join(games.GAMES)}, defaults to all of them")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[1, 2, 3, 7])
+    parser.add_argument("--generations", type=int, default=20)
+    args = parser.parse_args()
+    failed = False
+    for game in args.games or games.GAMES:
+        for seed in args.seeds:
+            difference = check(game, seed, args.generations)
+            if difference is None:
+                print(f"{game} seed {seed}: same species for {args.generations} generations")
+            else:
+                failed = True
+                print(f"{game} seed {seed}: {difference[1]} differ at generation {difference[0]}")
+    raise SystemExit(failed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import numpy as np
+import pygame as pg
+
+# Watch a whole generation train in one window: every agent of the BatchSim is drawn into the same frame.
+# Players are colored by species, the agent with the best fitness so far is outlined and targets are
+# drawn as outlines in their agent's color. Each game's BatchSim.rects() says what to draw.
+# Only every `every`-th frame is drawn, the frames in between run at full speed. Arrow keys draw
+# more or fewer frames. Closing the window (or escape) stops drawing, training carries on headless.
+#   python run.py fov train --view 5
+
+WHITE = (255, 255, 255)
+BEST = (255, 220, 0)
+
+
+class Viewer:
+    def __init__(self, population, width, height, every=1):
+        self.population = population
+        self.width = width
+        self.height = height
+        self.every = every
+        self.screen = None
+        self.font = None
+        self.closed = False
+        # color of each species id, kept across generations
+        self.palette = {}
+        # one surface per (color, width, height, filled), so a frame is a single blits call
+        self.sprites = {}
+        self.species = None
+
+    def start(self, genomes, episodes):
+        # call before every BatchSim episode. genomes are the simulated ones, each owns `episodes` agents in a row
+        if self.closed:
+            return
+        if self.screen is None:
+            pg.init()
+            self.screen = pg.display.set_mode((self.width, self.height))
+            pg.display.set_caption("Training")
+            self.font = pg.font.SysFont(None, 24)
+        species = self.population.species.genome_to_species
+        self.species = np.repeat([species.get(g.key, -1) for g in genomes], episodes)
+
+    def color(self, sid):
+        if sid not in self.palette:
+            color = pg.Color(0)
+            # golden angle steps keep neighbouring species apart
+            color.hsva = (sid * 137.508 % 360, 75, 100, 100)
+            self.palette[sid] = tuple(color)[:3]
+        return self.palette[sid]
+
+    def sprite(self, color, width, height, filled):
+        key = (color, width, height, filled)
+        if key not in self.sprites:
+            surface = pg.Surface((width, height))
+            if filled:
+                surface.fill(color)
+            else:
+                surface.set_colorkey((0, 0, 0))
+                pg.draw.rect(surface, color, (0, 0, width, height), 1)
+            self.sprites[key] = surface.convert()
+        return self.sprites[key]
+
+    def events(self):
+        for event in pg.event.get():
+            if event.type == pg.QUIT or (event.type == pg.KEYDOWN and event.key == pg.K_ESCAPE):
+                self.close()
+                return
+            if event.type == pg.KEYDOWN:
+                if event.key == pg.K_RIGHT:
+                    self.every *= 2
+                if event.key == pg.K_LEFT:
+                    self.every = max(self.every // 2, 1)
+
+    def frame(self, sim, running=None):
+        # call after every sim.step. running masks out agents an early stop has already settled
+        if self.closed or sim.frames % self.every:
+            return
+        self.events()
+        if self.closed:
+            return
+        if running is None:
+            running = np.ones(sim.n, dtype=bool)
+
+        self.screen.fill((0, 0, 0))
+        blits = []
+        for layer, agents, x, y, width, height in sim.rects():
+            agents, x, y, width, height = np.broadcast_arrays(agents, x, y, width, height)
+            for a, x, y, w, h in zip(agents.ravel().tolist(), x.ravel().tolist(), y.ravel().tolist(),
+                                     width.ravel().tolist(), height.ravel().tolist()):
+                if a < 0:
+                    blits.append((self.sprite(WHITE, w, h, True), (x, y)))
+                elif running[a]:
+                    blits.append((self.sprite(self.color(self.species[a]), w, h, layer == "player"), (x, y)))
+        self.screen.blits(blits, doreturn=False)
+
+        alive = np.flatnonzero(running)
+        if len(alive):
+            best = alive[np.argmax(sim.fitness[alive])]
+            for layer, agents, x, y, width, height in sim.rects():
+                if layer == "player":
+                    agents, x, y, width, height = np.broadcast_arrays(agents, x, y, width, height)
+                    pg.draw.rect(self.screen, BEST, (x[best] - 2, y[best] - 2, width[best] + 4, height[best] + 4), 2)
+
+        text = (f"generation {self.population.generation}  frame {sim.frames}  "
+                f"running {len(alive)}/{sim.n}  species {len(set(self.species.tolist()))}")
+        self.screen.blit(self.font.render(text, True, WHITE), (10, 10))
+        pg.display.flip()
+
+    def close(self):
+        if self.screen is not None and not self.closed:
+            pg.display.quit()
+        self.closed = True
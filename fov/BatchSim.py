@@ -0,0 +1,122 @@
+import random
+import numpy as np
+from common.sim import rect_round, overlap
+from Sim import FRAMES, OUT_OF_BOUNDS, PLAYER_SIZE, TARGET_SIZE, HISTORY, REWARD
+
+# the fov game for a whole population at once. Every agent gets the same rules as Sim,
+# but positions, targets, position history and fitness are numpy arrays and all agents move in lockstep
+
+
+class BatchSim:
+    horizon = FRAMES
+    penalty = OUT_OF_BOUNDS
+    # network outputs per agent that step() reads
+    actions = 4
+    # set to reward.zeros(n) to add up what every reward term earned, per agent
+    contributions = None
+
+    def __init__(self, width, height, seeds, history=HISTORY, reward=REWARD) -> None:
+        self.n = len(seeds)
+        self.width = width
+        self.height = height
+        self.reward = reward
+        self.speed = 15# max speed
+        self.range = 200
+        self.x = np.full(self.n, rect_round(width / 2) - PLAYER_SIZE // 2)
+        self.y = np.full(self.n, rect_round(height / 2) - PLAYER_SIZE // 2)
+
+        # per agent ring buffer of the last `history` centers, slot head is written next.
+        # Every agent's buffer is checked in one vectorized compare, Sim's grid index would not pay off here
+        self.size = history
+        self.history = np.zeros((self.n, history, 2), dtype=int)
+        self.history[:, 0, 0] = self.x + PLAYER_SIZE // 2
+        self.history[:, 0, 1] = self.y + PLAYER_SIZE // 2
+        self.history_len = np.ones(self.n, dtype=int)
+        self.head = np.ones(self.n, dtype=int) % history
+
+        # place every target like Sim, from the agent's own generator
+        self.tx = np.zeros(self.n, dtype=int)
+        self.ty = np.zeros(self.n, dtype=int)
+        player = (self.x[0], self.y[0], PLAYER_SIZE, PLAYER_SIZE)
+        for i, seed in enumerate(seeds):
+            rng = random.Random(seed)
+            while True:
+                self.tx[i], self.ty[i] = rng.randint(60, width-60), rng.randint(60, height-60)
+                if overlap(*player, self.tx[i], self.ty[i], TARGET_SIZE, TARGET_SIZE):
+                    continue
+                break
+
+        self.fitness = np.zeros(self.n)
+        self.frames = 0
+
+    @property
+    def done(self):
+        return self.frames >= FRAMES
+
+    def out_of_bounds(self):
+        return ~((self.x > 0) & (self.x < self.width) & (self.y > 0) & (self.y < self.height))
+
+    def deciding(self):
+        # every agent needs a network output every frame
+        return np.arange(self.n)
+
+    def distance(self):
+        # distance between the top left corners, pythagorean theorem
+        return np.sqrt((self.x - self.tx)**2 + (self.y - self.ty)**2)
+
+    def rects(self):
+        # what common/viewer.py draws: (layer, agent, x, y, width, height), agent -1 is scenery
+        agents = np.arange(self.n)
+        return [("target", agents, self.tx, self.ty, TARGET_SIZE, TARGET_SIZE),
+                ("player", agents, self.x, self.y, PLAYER_SIZE, PLAYER_SIZE)]
+
+    def observe(self):
+        dist = self.distance()
+        # if the target is within range, give coordinates and indicate that it is sensed
+        sensed = dist < self.range
+        return np.stack([dist, self.x, self.y, sensed,
+                         np.where(sensed, self.tx - self.x, 0),
+                         np.where(sensed, self.ty - self.y, 0)], axis=1).astype(float)
+
+    # advance every agent one frame from an (n, 4) array of network outputs and return the rewards
+    def step(self, outputs):
+        dist = self.distance()
+        sensed = dist < self.range
+        dec = np.argmax(outputs, axis=1)
+        self.y += self.speed * ((dec == 1).astype(int) - (dec == 0))
+        self.x += self.speed * ((dec == 3).astype(int) - (dec == 2))
+
+        hit = (self.x < self.tx + TARGET_SIZE) & (self.tx < self.x + PLAYER_SIZE) & \
+              (self.y < self.ty + TARGET_SIZE) & (self.ty < self.y + PLAYER_SIZE)
+        outside = self.out_of_bounds()
+
+        # discourage the player from staying in the same spot: count old centers under the player
+        px, py = self.history[:, :, 0], self.history[:, :, 1]
+        valid = np.arange(self.size) < self.history_len[:, None]
+        inside = (self.x[:, None] <= px) & (px < self.x[:, None] + PLAYER_SIZE) & \
+                 (self.y[:, None] <= py) & (py < self.y[:, None] + PLAYER_SIZE)
+        revisits = np.count_nonzero(inside & valid, axis=1)
+
+        closer = self.distance() < dist
+        reward = self.reward.batch({
+            "target": hit,
+            "out_of_bounds": outside,
+            "revisit": revisits,
+            "new_spot": revisits == 0,
+            "closer_sensed": closer & sensed,
+            "closer": closer & ~sensed,
+            "farther_sensed": ~closer & sensed,
+            "farther": ~closer & ~sensed,
+        }, self.n, self.contributions)
+
+        # hitting the target or leaving the screen end the frame before the history is updated
+        moved = np.flatnonzero(~hit & ~outside)
+        slots = self.head[moved]
+        self.history[moved, slots, 0] = self.x[moved] + PLAYER_SIZE // 2
+        self.history[moved, slots, 1] = self.y[moved] + PLAYER_SIZE // 2
+        self.head[moved] = (slots + 1) % self.size
+        self.history_len[moved] = np.minimum(self.history_len[moved] + 1, self.size)
+
+        self.fitness += reward
+        self.frames += 1
+        return reward
@@ -1,184 +1,132 @@
-import math
 import pygame as pg
-import random
-import neat, time
+import neat
+from common.scheduler import Scheduler, interpolate
+from Sim import Sim, HISTORY, REWARD
 
 
-pg.init()
-font = pg.font.SysFont(None, 24)
+# the font is only created once something is drawn
+font = None
 
-fps = 120
+# simulation steps per second in a window, see common/scheduler.py
+SPEED = 120
 
 class Game:
-    def __init__(self, screen, width, height) -> None:
+    def __init__(self, screen, width, height, seed=None, history=HISTORY, reward=REWARD, speed=SPEED) -> None:
         self.screen = screen
         self.width = width
         self.height = height
         self.clock = pg.time.Clock()
         self.running = True
-        # place player at the bottom of the screen
-        self.player = pg.Rect(0, 0, 20, 20)
-        self.player.center = (width / 2, height/2)
-        self.speed = 15# max speed
-        self.range = 200
-        self.old_positions = [self.player.center]
-
-        while True:
-            self.target = pg.Rect(random.randint(60, width-60), random.randint(60, height-60), 70, 70)
-            if self.player.colliderect(self.target):
-                continue
-            break
-
-        self.frames = 0
+        # all game state lives in the simulation, this class only drives and draws it
+        self.sim = Sim(width, height, seed, history, reward)
+        # steps and frames of a game in a window. Arrow keys change its speed
+        self.scheduler = Scheduler(speed)
+        # player rect before the last step, the drawn player moves from there at the scheduler's alpha
+        self.previous = None
 
         self.net = None
         self.genome = None
+        # times the phases of every frame when set, see common/profiler.py
+        self.profiler = None
 
-        self.record = False
+        # frames are streamed into this while testing, see common/recorder.py
+        self.recorder = None
+        # every step is kept in this while testing, see common/replay.py
+        self.log = None
         self.follow_mouse = False
-        self.record_frames = []
 
     def run(self):
+        if self.profiler is not None:
+            self.profiler.start(self.genome.key)
         while self.running:
-            self.loop()
-            if self.frames == 325:
-                print(self.genome.fitness)
-                break
+            for _ in self.scheduler.due():
+                self.previous = self.sim.player_rect
+                # the mouse replaces the randomly placed target
+                if self.follow_mouse and pg.mouse.get_focused():
+                    self.sim.move_target(pg.mouse.get_pos())
+                self.step()
+                if self.over():
+                    self.running = False
+                    break
+            self.render()
 
-    def train(self, genome, config):
-        start = time.time()
-        self.genome = genome
-        self.net = neat.nn.FeedForwardNetwork.create(genome, config)
-        self.run()
-        return time.time() - start
+    def over(self):
+        # after every step. Training never gets here, it plays the Sim alone, see common/episode.py
+        if self.sim.done:
+            print(self.genome.fitness)
+            return True
+        return False
 
     def draw(self):
+        player = pg.Rect(interpolate(self.previous, self.sim.player_rect, self.scheduler.alpha))
+        pg.draw.circle(self.screen, (255, 255, 255), player.center, self.sim.range, 1)
+        pg.draw.rect(self.screen, (255, 255, 255), self.sim.target_rect)
+        pg.draw.rect(self.screen, (50, 120, 255), player)
+        for pos in self.sim.visits:
+            pg.draw.rect(self.screen, (255, 255, 255), (pos[0], pos[1], 5, 5))
 
-        # if self.follow_mouse and pg.mouse.get_focused():
-        #     self.target.center = pg.mouse.get_pos()
-        # elif self.frames % 200 == 0:
-        #     self.target.center = (random.randint(30, self.width-30), random.randint(30, self.height-30))
-
-        pg.draw.circle(self.screen, (255, 255, 255), self.player.center, self.range, 1)
-        pg.draw.rect(self.screen, (255, 255, 255), self.target)
-        pg.draw.rect(self.screen, (50, 120, 255), self.player)
-
-        global fps
+        global font
+        if font is None:
+            font = pg.font.SysFont(None, 24)
         # fps may become too much at times to render
         try:
             frame_rate_render = font.render(
-                f"FPS: {round(self.clock.get_fps())}/{fps}", True, (255, 255, 255)
+                f"FPS: {round(self.clock.get_fps())}  speed: {self.scheduler.speed or 'max'}", True, (255, 255, 255)
             )
             self.screen.blit(frame_rate_render, (10, 30))
         except:
             pass
 
-    def loop(self):
-        global fps
+    def lap(self, phase):
+        if self.profiler is not None:
+            self.profiler.lap(phase)
+
+    def step(self):
+        inputs = self.sim.observe()
+        self.lap("observe")
+        output = self.net.activate(inputs)
+        self.lap("network")
+        self.genome.fitness += self.sim.step(output) if self.log is None else self.log.step(inputs, output)
+        self.lap("reward")
+
+    def render(self):
         self.screen.fill((0, 0, 0))
         for event in pg.event.get():
             if event.type == pg.QUIT:
                 self.running = False
-            # use arrow keys to change fps
+            # arrow keys double or halve the speed, past the fastest it runs as fast as it can
 
             if event.type == pg.KEYDOWN:
                 if event.key == pg.K_ESCAPE:
                     self.running = False
                 if event.key == pg.K_RIGHT:
-                    fps = 100000
+                    self.scheduler.faster()
                 if event.key == pg.K_LEFT:
-                    fps = 120
+                    self.scheduler.slower()
+        self.lap("events")
 
-        self.get_input()
         self.draw()
+        self.lap("draw")
+        pg.display.flip()
+        self.lap("flip")
 
-        # updae screen every few frames or if fps is low
-        if fps == 120:
-            pg.display.flip()
-            self.clock.tick(fps)
-
-        if self.record:
+        if self.recorder is not None:
             # get the surface as a numpy array and swap axes. Much, much faster than writing an image
-            self.record_frames.append(pg.surfarray.array3d(self.screen).swapaxes(0, 1))
-        self.frames += 1
-
-    def get_input(self):
-        # get dx and dy from target to player pythagorean theorem
-        dist = math.sqrt((self.player.x - self.target.x)**2 + (self.player.y - self.target.y)**2)
-        sensed = False
-        inps = [dist, self.player.x, self.player.y]
-        # if the target is within range, give coordinates and indicate that it is sensed
-        if dist < self.range:
-            inps.append(1)
-            inps.append(self.target.x - self.player.x)
-            inps.append(self.target.y - self.player.y)
-            sensed = True
-        else:
-            inps.append(0)
-            inps.append(0)
-            inps.append(0)
-        # feed inputs into the neural network
-        output = self.net.activate(inps)
-        dec = output.index(max(output))
-        # move up
-        if dec == 0:
-            self.player.y -= self.speed
-        # move down
-        elif dec == 1:
-            self.player.y += self.speed
-        # move left
-        elif dec == 2:
-            self.player.x -= self.speed
-        # move right
-        elif dec == 3:
-            self.player.x += self.speed
-
-        # if the player collides with the target, reward it 
-        if self.player.colliderect(self.target):
-            self.genome.fitness += 4
-            return
-
-        if not (self.player.x > 0 and self.player.x < self.width and self.player.y > 0 and self.player.y < self.height):
-            self.genome.fitness -= 4
-            return
-
-        # discourage the player from staying in the same spot
-        hit = False
-        for pos in self.old_positions:
-            pg.draw.rect(self.screen, (255, 255, 255), (pos[0], pos[1], 5, 5))
-            if self.player.collidepoint(pos):
-                self.genome.fitness -= 0.13
-                hit = True
-        if not hit:
-            self.genome.fitness += 0.4
-        self.old_positions.append(self.player.center)
-        # only keep the last 15 positions
-        if len(self.old_positions) > 15:
-            self.old_positions.pop(0)
-
-        # reward based on new distance to target 
-        new_dist = math.sqrt((self.player.x - self.target.x)**2 + (self.player.y - self.target.y)**2)
-        new_dist = new_dist if new_dist >= 0 else 1
-
-        if new_dist < dist:
-            if sensed:
-                self.genome.fitness += 0.9
-            else:
-                self.genome.fitness += 0.2
-        else:
-            if sensed:
-                self.genome.fitness -= 1.2
-            else:
-                self.genome.fitness -= 0.2
-        
-        
-    def test(self, genome, config, follow_mouse=False) -> list:
-        global fps
-        fps = 120
+            self.recorder.add(pg.surfarray.array3d(self.screen).swapaxes(0, 1))
+        self.lap("record")
+        self.scheduler.wait()
+        self.clock.tick()
+        self.lap("tick")
+
+    def test(self, genome, config, follow_mouse=False, recorder=None, profiler=None, log=None):
         self.follow_mouse = follow_mouse
         self.genome = genome
         self.net = neat.nn.FeedForwardNetwork.create(genome, config)
-        self.record = True
+        self.recorder = recorder
+        self.log = log
+        # a recording gets a frame of every step
+        self.scheduler.lockstep = recorder is not None
+        self.profiler = self.sim.profiler = profiler
         self.run()
         print(self.genome.fitness)
-        return self.record_frames
+        return self.genome.fitness
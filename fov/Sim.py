@@ -0,0 +1,205 @@
+import math
+import random
+from common.rewards import Reward, Term
+from common.sim import rect_round, overlap
+
+# pygame-free simulation of the fov game. Game.py only reads this state to draw it
+
+FRAMES = 325
+# fitness lost for every frame spent off screen
+OUT_OF_BOUNDS = -4
+PLAYER_SIZE = 20
+TARGET_SIZE = 70
+# how many past positions are remembered to discourage standing still, by default
+HISTORY = 15
+
+# what a frame is worth, the first final term that happens decides it. See common/rewards.py
+REWARD = Reward(
+    Term("target", 4, final=True),
+    Term("out_of_bounds", OUT_OF_BOUNDS, final=True),
+    # staying in the same spot: for every remembered position under the player, or once if there is none
+    Term("revisit", -0.13),
+    Term("new_spot", 0.4),
+    # distance to the target, worth more while the target is in range
+    Term("closer_sensed", 0.9),
+    Term("closer", 0.2),
+    Term("farther_sensed", -1.2),
+    Term("farther", -0.2),
+)
+
+
+class VisitIndex:
+    """
+    The last `size` player centers, in a ring buffer and bucketed by grid cell.
+    Cells are as big as the player, so the player covers at most 2x2 of them and count()
+    only looks at the positions in those, however long the history is.
+    The oldest position is dropped from its cell when the ring buffer wraps.
+    """
+    def __init__(self, size):
+        self.size = size
+        self.ring = [None] * size
+        self.head = 0
+        self.length = 0
+        # positions ever added, a replay log tells the frames that added one by it
+        self.added = 0
+        # (cell x, cell y) -> {position: times it is in the ring}
+        self.cells = {}
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        # oldest first
+        start = self.head - self.length
+        for i in range(start, self.head):
+            yield self.ring[i % self.size]
+
+    def add(self, pos):
+        old = self.ring[self.head]
+        if self.length == self.size:
+            cell = self.cells[old[0] // PLAYER_SIZE, old[1] // PLAYER_SIZE]
+            cell[old] -= 1
+            if not cell[old]:
+                del cell[old]
+        else:
+            self.length += 1
+        self.ring[self.head] = pos
+        self.head = (self.head + 1) % self.size
+        self.added += 1
+        cell = self.cells.setdefault((pos[0] // PLAYER_SIZE, pos[1] // PLAYER_SIZE), {})
+        cell[pos] = cell.get(pos, 0) + 1
+
+    def count(self, x, y):
+        # remembered positions inside the player square with top left corner x, y
+        count = 0
+        for cx in range(x // PLAYER_SIZE, (x + PLAYER_SIZE - 1) // PLAYER_SIZE + 1):
+            for cy in range(y // PLAYER_SIZE, (y + PLAYER_SIZE - 1) // PLAYER_SIZE + 1):
+                for (px, py), times in self.cells.get((cx, cy), {}).items():
+                    if x <= px < x + PLAYER_SIZE and y <= py < y + PLAYER_SIZE:
+                        count += times
+        return count
+
+
+class Sim:
+    horizon = FRAMES
+    penalty = OUT_OF_BOUNDS
+    # set to a Profiler to time the movement apart from the reward, see common/profiler.py
+    profiler = None
+    # set to reward.zeros() to add up what every reward term earned
+    contributions = None
+
+    def __init__(self, width, height, seed=None, history=HISTORY, reward=REWARD) -> None:
+        self.width = width
+        self.height = height
+        self.reward = reward
+        # every random choice comes from here, so a seed replays the exact same episode
+        self.random = random.Random(seed)
+        self.speed = 15# max speed
+        self.range = 200
+        # positions are top left corners, like pg.Rect
+        self.x = rect_round(width / 2) - PLAYER_SIZE // 2
+        self.y = rect_round(height / 2) - PLAYER_SIZE // 2
+        # recent centers, to discourage the player from staying in the same spot
+        self.visits = VisitIndex(history)
+        self.visits.add(self.center())
+
+        while True:
+            self.tx, self.ty = self.random.randint(60, width-60), self.random.randint(60, height-60)
+            if overlap(*self.player_rect, *self.target_rect):
+                continue
+            break
+
+        self.frames = 0
+
+    @property
+    def done(self):
+        return self.frames >= FRAMES
+
+    @property
+    def player_rect(self):
+        return (self.x, self.y, PLAYER_SIZE, PLAYER_SIZE)
+
+    @property
+    def target_rect(self):
+        return (self.tx, self.ty, TARGET_SIZE, TARGET_SIZE)
+
+    def out_of_bounds(self):
+        return not (self.x > 0 and self.x < self.width and self.y > 0 and self.y < self.height)
+
+    def center(self):
+        return self.x + PLAYER_SIZE // 2, self.y + PLAYER_SIZE // 2
+
+    def move_target(self, center):
+        # the target never moves on its own, the front-end can move it (follow mouse)
+        self.tx = rect_round(center[0]) - TARGET_SIZE // 2
+        self.ty = rect_round(center[1]) - TARGET_SIZE // 2
+
+    def snapshot(self):
+        # what a frame looks like, one row of a replay log (common/replay.py)
+        return {"x": self.x, "y": self.y, "tx": self.tx, "ty": self.ty, "visits": self.visits.added}
+
+    def restore(self, row):
+        # back to a frame of a replay log, for drawing it. Rows have to come in order, the
+        # remembered positions are rebuilt from the frames that added one
+        self.x, self.y, self.tx, self.ty = row["x"], row["y"], row["tx"], row["ty"]
+        if self.visits.added < row["visits"]:
+            self.visits.add(self.center())
+
+    def distance(self):
+        # distance between the top left corners, pythagorean theorem
+        return math.sqrt((self.x - self.tx)**2 + (self.y - self.ty)**2)
+
+    def observe(self):
+        dist = self.distance()
+        inps = [dist, self.x, self.y]
+        # if the target is within range, give coordinates and indicate that it is sensed
+        if dist < self.range:
+            inps += [1, self.tx - self.x, self.ty - self.y]
+        else:
+            inps += [0, 0, 0]
+        return inps
+
+    # advance one frame using the network output and return the reward earned
+    def step(self, output):
+        reward = self.act(output)
+        self.frames += 1
+        return reward
+
+    def act(self, output):
+        dist = self.distance()
+        sensed = dist < self.range
+        dec = max(range(len(output)), key=output.__getitem__)
+        # move up
+        if dec == 0:
+            self.y -= self.speed
+        # move down
+        elif dec == 1:
+            self.y += self.speed
+        # move left
+        elif dec == 2:
+            self.x -= self.speed
+        # move right
+        elif dec == 3:
+            self.x += self.speed
+
+        if self.profiler is not None:
+            self.profiler.lap("physics")
+
+        hit = overlap(*self.player_rect, *self.target_rect)
+        outside = self.out_of_bounds()
+        revisits = 0
+        # hitting the target or leaving the screen end the frame before the history is updated
+        if not hit and not outside:
+            revisits = self.visits.count(self.x, self.y)
+            self.visits.add(self.center())
+        closer = self.distance() < dist
+        return self.reward.one({
+            "target": hit,
+            "out_of_bounds": outside,
+            "revisit": revisits,
+            "new_spot": revisits == 0,
+            "closer_sensed": closer and sensed,
+            "closer": closer and not sensed,
+            "farther_sensed": not closer and sensed,
+            "farther": not closer and not sensed,
+        }, self.contributions)
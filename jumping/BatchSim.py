@@ -0,0 +1,149 @@
+import random
+import numpy as np
+from common.sim import rect_round
+from Sim import FRAMES, OUT_OF_BOUNDS, PLAYER_SIZE, FLOOR_HEIGHT, OBSTACLE_WIDTH, TARGET_SIZE, REWARD
+
+# the jumping game for a whole population at once. Every agent gets the same rules as Sim,
+# but players and obstacles live in structured numpy arrays and all agents are stepped together
+
+# Sim only spawns a new obstacle once the last one is gone
+MAX_OBSTACLES = 1
+
+PLAYER = np.dtype([("y", int), ("vy", float)])
+OBSTACLE = np.dtype([
+    ("active", bool),
+    ("x", int),
+    ("height", int),
+    ("target_y", int), # the target's x is always x + 5
+    ("dodged", bool),
+    ("hit_target", bool),
+])
+
+
+class BatchSim:
+    horizon = FRAMES
+    penalty = OUT_OF_BOUNDS
+    # network outputs per agent that step() reads
+    actions = 1
+    # set to reward.zeros(n) to add up what every reward term earned, per agent
+    contributions = None
+
+    def __init__(self, width, height, seeds, capacity=MAX_OBSTACLES, reward=REWARD) -> None:
+        self.n = len(seeds)
+        self.width = width
+        self.height = height
+        self.reward = reward
+        # one generator per agent so agent i sees exactly what Sim(seed=seeds[i]) would
+        self.randoms = [random.Random(seed) for seed in seeds]
+        self.gravity = 0.3
+        # every player stands at the same x, only y and vy differ
+        self.x = rect_round(width / 2) - PLAYER_SIZE // 2
+        self.floor = height - FLOOR_HEIGHT # top of the floor
+        self.player = np.zeros(self.n, dtype=PLAYER)
+        self.player["y"] = rect_round(height - 40) - PLAYER_SIZE // 2
+        # obstacles on screen at once per agent, more than MAX_OBSTACLES no longer plays like Sim
+        self.capacity = capacity
+        self.obstacles = np.zeros((self.n, capacity), dtype=OBSTACLE)
+        self.dodged = np.zeros(self.n, dtype=int)
+
+        self.fitness = np.zeros(self.n)
+        self.frames = 0
+
+    @property
+    def done(self):
+        return self.frames >= FRAMES
+
+    def out_of_bounds(self):
+        return self.player["y"] < 0
+
+    def grounded(self):
+        return (self.player["vy"] == 0) & (self.player["y"] + PLAYER_SIZE == self.floor)
+
+    def deciding(self):
+        # the network only decides while the player stands on the floor
+        return np.flatnonzero(self.grounded())
+
+    def rects(self):
+        # what common/viewer.py draws: (layer, agent, x, y, width, height), agent -1 is scenery
+        agents, slots = np.nonzero(self.obstacles["active"])
+        obs = self.obstacles[agents, slots]
+        return [("scenery", -1, 0, self.floor, self.width, FLOOR_HEIGHT),
+                ("target", agents, obs["x"], self.floor - obs["height"], OBSTACLE_WIDTH, obs["height"]),
+                ("target", agents, obs["x"] + 5, obs["target_y"], TARGET_SIZE, TARGET_SIZE),
+                ("player", np.arange(self.n), self.x, self.player["y"], PLAYER_SIZE, PLAYER_SIZE)]
+
+    def observe(self):
+        obs = self.obstacles
+        # find closest obstacle still in front of each player
+        ahead = obs["active"] & (obs["x"] > self.x + PLAYER_SIZE)
+        closest = np.argmin(np.where(ahead, obs["x"], np.iinfo(int).max), axis=1)
+        found = ahead.any(axis=1)
+        nearest = obs[np.arange(self.n), closest]
+
+        dist = np.where(found, nearest["x"] - self.x, 0)
+        height = np.where(found, nearest["height"], 0)
+        targ_dist = np.sqrt((nearest["x"] + OBSTACLE_WIDTH // 2 - TARGET_SIZE // 2 - self.x) ** 2 +
+                            (nearest["target_y"] - self.player["y"]) ** 2)
+        targ_dist = np.where(found, targ_dist, 0)
+        return np.stack([dist, height, targ_dist], axis=1).astype(float)
+
+    # advance every agent one frame and return the rewards. outputs are only read for deciding() agents
+    def step(self, outputs):
+        player = self.player
+        grounded = self.grounded()
+
+        # agents in the air keep falling, rounded like a pg.Rect
+        air = ~grounded
+        y = player["y"][air] + player["vy"][air]
+        player["y"][air] = np.sign(y) * np.floor(np.abs(y) + 0.5)
+        player["vy"][air] += self.gravity
+        landed = air & (player["y"] + PLAYER_SIZE > self.floor)
+        player["y"][landed] = self.floor - PLAYER_SIZE
+        player["vy"][landed] = 0
+
+        # agents on the floor jump if the network says so
+        dec = outputs[:, 0]
+        jump = grounded & (dec >= 5)
+        player["vy"][jump] = -1 * dec[jump]
+
+        self.spawn()
+        state = self.update()
+        state["jump"] = jump
+        # penalize jumping off the top of the screen
+        state["out_of_bounds"] = self.out_of_bounds()
+        reward = self.reward.batch(state, self.n, self.contributions)
+        self.fitness += reward
+        self.frames += 1
+        return reward
+
+    def spawn(self):
+        obs = self.obstacles
+        for i in np.flatnonzero(obs["active"].sum(axis=1) < self.capacity):
+            slot = np.argmin(obs["active"][i])
+            # same draw as Sim's Obstacle
+            height = self.randoms[i].randint(60, round(self.height/2))
+            obs[i, slot] = (True, self.width, height, self.height - height - 60 - TARGET_SIZE // 2, False, False)
+
+    def update(self):
+        # move the obstacles, and count what happened to them for the reward
+        obs = self.obstacles
+        y = self.player["y"][:, None]
+        active = obs["active"]
+        obs["x"][active] -= 6
+        right = obs["x"] + OBSTACLE_WIDTH
+        top = self.floor - obs["height"]
+        gone = active & (right < 0)
+        crashed = active & ~gone & (self.x < right) & (obs["x"] < self.x + PLAYER_SIZE) & \
+                  (y < self.floor) & (top < y + PLAYER_SIZE)
+        # check if player dodged obstacle
+        dodged = active & ~gone & ~crashed & (right < self.x) & ~obs["dodged"]
+        # if the target is hit, add more fitness. Checked even for obstacles that were just removed
+        tx = obs["x"] + OBSTACLE_WIDTH // 2 - TARGET_SIZE // 2
+        hit = active & ~obs["hit_target"] & (self.x < tx + TARGET_SIZE) & (tx < self.x + PLAYER_SIZE) & \
+              (y < obs["target_y"] + TARGET_SIZE) & (obs["target_y"] < y + PLAYER_SIZE)
+
+        obs["active"][gone | crashed] = False
+        obs["dodged"][dodged] = True
+        obs["hit_target"][hit] = True
+        self.dodged += dodged.sum(axis=1)
+        return {"crash": crashed.sum(axis=1), "dodge": dodged.sum(axis=1), "target": hit.sum(axis=1)}
@@ -1,193 +1,144 @@
 import pygame as pg
-import random
-import neat, time
-import math
+import neat
+from common.scheduler import Scheduler, interpolate
+from Sim import Sim, REWARD
 
 # simple pygame game that allows user to jump to avoid an obstacle
 
-# initialize pygame
-pg.init()
-font = pg.font.SysFont(None, 24)
+# the font is only created once something is drawn
+font = None
 
-fps = 60
-
-
-class Obstacle:
-    def __init__(self, screen_w, screen_h) -> None:
-        self.height = random.randint(60, round(screen_h/2))
-        self.pos = pg.Rect(0, 0, 20, self.height)
-        self.pos.bottomleft = (screen_w, screen_h - 20)
-        self.target = pg.Rect(0, 0, 10, 10)
-        self.target.center = (screen_w + 10, screen_h - self.height - 60)
-        self.dodged = False
-        self.hit_target = False
-    
-    def move(self):
-        self.pos.x -= 6
-        self.target.x -= 6
-
-    def draw(self, screen):
-        color = (255, 255, 255)
-        if self.hit_target:
-            color = (0, 255, 0)
-        pg.draw.rect(screen, (255, 255, 255), self.pos)
-        pg.draw.rect(screen, color, self.target)
+# simulation steps per second in a window, see common/scheduler.py
+SPEED = 100
 
 
 class Game:
-    def __init__(self, screen, width, height) -> None:
+    def __init__(self, screen, width, height, seed=None, reward=REWARD, speed=SPEED) -> None:
         self.screen = screen
         self.width = width
         self.height = height
         self.clock = pg.time.Clock()
         self.running = True
-        self.vy = 0
-        self.gravity = 0.3
-        # place player at the bottom of the screen
-        self.player = pg.Rect(0, 0, 20, 20)
-        self.player.center = (width / 2, height - 40)
-        self.floor = pg.Rect(0, height - 20, width, 20)
-        self.obstacles: list[Obstacle] = []
-        self.dodged = 0
-
-        self.frames = 0
+        # all game state lives in the simulation, this class only drives and draws it
+        self.sim = Sim(width, height, seed, reward=reward)
+        # steps and frames of a game in a window. Arrow keys change its speed
+        self.scheduler = Scheduler(speed)
+        # player rect and obstacle xs before the last step, drawn moving from there at the scheduler's alpha
+        self.previous = None
 
         self.net = None
         self.genome = None
+        # times the phases of every frame when set, see common/profiler.py
+        self.profiler = None
 
-        self.record = False
-        self.record_frames = []
+        # frames are streamed into this while testing, see common/recorder.py
+        self.recorder = None
+        # every step is kept in this while testing, see common/replay.py
+        self.log = None
 
     def run(self):
+        if self.profiler is not None:
+            self.profiler.start(self.genome.key)
         while self.running:
-            self.loop()
-            if self.frames >= 1500:
-                print(self.genome.fitness)
-                break
-
-    def train(self, genome, config):
-        start = time.time()
-        self.genome = genome
-        self.net = neat.nn.FeedForwardNetwork.create(genome, config)
-        self.run()
-        return time.time() - start
-
-    def jump(self, v):
-        if self.vy == 0 and self.player.bottom == self.floor.top:
-            self.vy = -1 * v
+            for _ in self.scheduler.due():
+                self.previous = self.sim.player_rect, {o: o.x for o in self.sim.obstacles}
+                self.step()
+                if self.over():
+                    self.running = False
+                    break
+            self.render()
+
+    def over(self):
+        # after every step. Training never gets here, it plays the Sim alone, see common/episode.py
+        if self.sim.done:
+            print(self.genome.fitness)
+            return True
+        return False
+
+    def lap(self, phase):
+        if self.profiler is not None:
+            self.profiler.lap(phase)
+
+    def step(self):
+        # get decistion from neural network while the player is on the floor
+        inputs = self.sim.observe()
+        self.lap("observe")
+        output = self.net.activate(inputs) if inputs is not None else None
+        self.lap("network")
+        self.genome.fitness += self.sim.step(output) if self.log is None else self.log.step(inputs, output)
+        self.lap("reward")
 
     def draw(self):
-        pg.draw.rect(self.screen, (50, 210, 255), self.player)
-        # write a comment for the thing below
-        if self.player.y < 0:
-            self.genome.fitness -= 2
+        alpha = self.scheduler.alpha
+        player, xs = self.previous or (None, {})
+        player = pg.Rect(interpolate(player, self.sim.player_rect, alpha))
+        pg.draw.rect(self.screen, (50, 210, 255), player)
         # draw floor
-        pg.draw.rect(self.screen, (255, 255, 255), self.floor)
-        # handle obstacles
-        for obstacle in self.obstacles:
-            obstacle.move()
-            obstacle.draw(self.screen)
-            if obstacle.pos.right < 0:
-                self.obstacles.remove(obstacle)
-            elif self.player.colliderect(obstacle.pos):
-                self.genome.fitness -= 40
-                self.obstacles.remove(obstacle)
-            # check if player dodged obstacle
-            elif obstacle.pos.right < self.player.left and not obstacle.dodged:
-                self.dodged += 1
-                obstacle.dodged = True
-                self.genome.fitness += 50
-            # if the target is hit, add more fitness
-            if self.player.colliderect(obstacle.target) and not obstacle.hit_target:
-                self.genome.fitness += 100
-                obstacle.hit_target = True
-        
-        # draw green line from player to target and player to obstacle
-        for obstacle in self.obstacles:
-            pg.draw.line(self.screen, (0, 255, 0), self.player.center, obstacle.target.center)
-            pg.draw.line(self.screen, (0, 255, 0), self.player.center, (obstacle.pos.left, self.height - 30))
+        pg.draw.rect(self.screen, (255, 255, 255), self.sim.floor_rect)
+        for obstacle in self.sim.obstacles:
+            color = (255, 255, 255)
+            if obstacle.hit_target:
+                color = (0, 255, 0)
+            # obstacles only move sideways, a new one is drawn where it is
+            shift = (xs.get(obstacle, obstacle.x) - obstacle.x) * (1 - alpha)
+            pg.draw.rect(self.screen, (255, 255, 255), pg.Rect(obstacle.rect).move(shift, 0))
+            pg.draw.rect(self.screen, color, pg.Rect(obstacle.target_rect).move(shift, 0))
 
-        global fps
+        # draw green line from player to target and player to obstacle
+        for obstacle in self.sim.obstacles:
+            shift = (xs.get(obstacle, obstacle.x) - obstacle.x) * (1 - alpha)
+            pg.draw.line(self.screen, (0, 255, 0), player.center, pg.Rect(obstacle.target_rect).move(shift, 0).center)
+            pg.draw.line(self.screen, (0, 255, 0), player.center, (obstacle.x + shift, self.height - 30))
+
+        global font
+        if font is None:
+            font = pg.font.SysFont(None, 24)
         # fps may become too much at times to render
         try:
             frame_rate_render = font.render(
-                f"FPS: {round(self.clock.get_fps())}/{fps}", True, (255, 255, 255)
+                f"FPS: {round(self.clock.get_fps())}  speed: {self.scheduler.speed or 'max'}", True, (255, 255, 255)
             )
             self.screen.blit(frame_rate_render, (10, 30))
         except:
             pass
 
-    def loop(self):
-        global fps
+    def render(self):
         self.screen.fill((0, 0, 0))
         for event in pg.event.get():
             if event.type == pg.QUIT:
                 self.running = False
-            # use arrow keys to change fps
+            # arrow keys double or halve the speed, past the fastest it runs as fast as it can
 
             if event.type == pg.KEYDOWN:
                 if event.key == pg.K_ESCAPE:
                     self.running = False
                 if event.key == pg.K_RIGHT:
-                    fps += 1000
+                    self.scheduler.faster()
                 if event.key == pg.K_LEFT:
-                    if fps > 50:
-                        fps -= 1000
-
-        # check for jump
-        if self.vy != 0 or self.player.bottom != self.floor.top:
-            self.player.y += self.vy
-            self.vy += self.gravity
-            # check if player is on the floor
-            if self.player.bottom > self.floor.top:
-                self.player.bottom = self.floor.top
-                # reset vy
-                self.vy = 0
-        else:
-            # get decistion from neural network
-            self.get_input()
-
-        # if random.randint(0, 100) == 0 and len(self.obstacles) <= 2:
-        if len(self.obstacles) < 1:
-            self.obstacles.append(Obstacle(self.width, self.height))
+                    self.scheduler.slower()
+        self.lap("events")
 
         self.draw()
+        self.lap("draw")
+        pg.display.flip()
+        self.lap("flip")
 
-        # updae screen every few frames or if fps is low
-        if self.frames % 250 == 0 or fps < 1000:
-            pg.display.flip()
-
-        if self.record:
+        if self.recorder is not None:
             # get the surface as a numpy array and swap axes. Much, much faster than writing an image
-            self.record_frames.append(pg.surfarray.array3d(self.screen).swapaxes(0, 1))
-        self.frames += 1
-        self.clock.tick(fps)
-
-    def get_input(self):
-        # find closest obstacle still in front of player
-        closest = None
-        dist = 0
-        for obstacle in self.obstacles:
-            if obstacle.pos.left > self.player.right:
-                if closest == None or obstacle.pos.left < closest.pos.left:
-                    closest = obstacle
-                    dist = obstacle.pos.right - self.player.right
-
-        height = closest.height if closest is not None else 0
-        targ_dist = math.sqrt((closest.target.x - self.player.x) ** 2 + (closest.target.y - self.player.y) ** 2) if height > 0 else 0
-        # input distance to next obstacle
-        output = self.net.activate((dist, height, targ_dist))
-        dec = output[0]
-        if dec >= 5:
-            self.jump(dec)
-            self.genome.fitness += 5
-
-    def test(self, genome, config) -> list:
-        global fps
-        fps = 100
+            self.recorder.add(pg.surfarray.array3d(self.screen).swapaxes(0, 1))
+        self.lap("record")
+        self.scheduler.wait()
+        self.clock.tick()
+        self.lap("tick")
+
+    def test(self, genome, config, recorder=None, profiler=None, log=None):
         self.genome = genome
         self.net = neat.nn.FeedForwardNetwork.create(genome, config)
-        self.record = True
+        self.recorder = recorder
+        self.log = log
+        # a recording gets a frame of every step
+        self.scheduler.lockstep = recorder is not None
+        self.profiler = self.sim.profiler = profiler
         self.run()
         print(self.genome.fitness)
-        return self.record_frames
+        return self.genome.fitness
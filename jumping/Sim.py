@@ -0,0 +1,194 @@
+import math
+import random
+from common.rewards import Reward, Term
+from common.sim import rect_round, overlap
+
+# pygame-free simulation of the jumping game. Game.py only reads this state to draw it
+
+FRAMES = 1500
+# fitness lost for every frame spent off screen
+OUT_OF_BOUNDS = -2
+PLAYER_SIZE = 20
+FLOOR_HEIGHT = 20
+OBSTACLE_WIDTH = 20
+TARGET_SIZE = 10
+
+# what a frame is worth, every term adds up. See common/rewards.py
+REWARD = Reward(
+    Term("jump", 5),
+    Term("out_of_bounds", OUT_OF_BOUNDS),
+    # for every obstacle run into, jumped over, or whose target was touched
+    Term("crash", -40),
+    Term("dodge", 50),
+    Term("target", 100),
+)
+
+
+class Obstacle:
+    def __init__(self, screen_w, screen_h, rng) -> None:
+        self.height = rng.randint(60, round(screen_h/2))
+        # the obstacle stands on the floor at the right edge of the screen
+        self.x = screen_w
+        self.y = screen_h - FLOOR_HEIGHT - self.height
+        # the target floats above it
+        self.tx = screen_w + 10 - TARGET_SIZE // 2
+        self.ty = screen_h - self.height - 60 - TARGET_SIZE // 2
+        self.dodged = False
+        self.hit_target = False
+
+    @property
+    def rect(self):
+        return (self.x, self.y, OBSTACLE_WIDTH, self.height)
+
+    @property
+    def target_rect(self):
+        return (self.tx, self.ty, TARGET_SIZE, TARGET_SIZE)
+
+    @property
+    def right(self):
+        return self.x + OBSTACLE_WIDTH
+
+    def move(self):
+        self.x -= 6
+        self.tx -= 6
+
+
+class Sim:
+    horizon = FRAMES
+    penalty = OUT_OF_BOUNDS
+    # set to a Profiler to time the movement apart from the reward, see common/profiler.py
+    profiler = None
+    # set to reward.zeros() to add up what every reward term earned
+    contributions = None
+
+    def __init__(self, width, height, seed=None, reward=REWARD) -> None:
+        self.width = width
+        self.height = height
+        self.reward = reward
+        # every random choice comes from here, so a seed replays the exact same episode
+        self.random = random.Random(seed)
+        self.vy = 0
+        self.gravity = 0.3
+        # place player at the bottom of the screen, positions are top left corners like pg.Rect
+        self.x = rect_round(width / 2) - PLAYER_SIZE // 2
+        self.y = rect_round(height - 40) - PLAYER_SIZE // 2
+        self.floor = height - FLOOR_HEIGHT # top of the floor
+        self.obstacles: list[Obstacle] = []
+        self.dodged = 0
+
+        self.frames = 0
+
+    @property
+    def done(self):
+        return self.frames >= FRAMES
+
+    @property
+    def player_rect(self):
+        return (self.x, self.y, PLAYER_SIZE, PLAYER_SIZE)
+
+    @property
+    def floor_rect(self):
+        return (0, self.floor, self.width, FLOOR_HEIGHT)
+
+    def out_of_bounds(self):
+        return self.y < 0
+
+    @property
+    def grounded(self):
+        return self.vy == 0 and self.y + PLAYER_SIZE == self.floor
+
+    def snapshot(self):
+        # what a frame looks like, one row of a replay log (common/replay.py). There is at most one obstacle
+        obstacle = self.obstacles[0] if self.obstacles else None
+        return {
+            "y": self.y, "vy": self.vy, "dodged": self.dodged,
+            "obstacle": obstacle is not None,
+            "obstacle_x": obstacle.x if obstacle else 0,
+            "obstacle_height": obstacle.height if obstacle else 0,
+            "obstacle_tx": obstacle.tx if obstacle else 0,
+            "obstacle_ty": obstacle.ty if obstacle else 0,
+            "obstacle_dodged": obstacle.dodged if obstacle else False,
+            "obstacle_hit_target": obstacle.hit_target if obstacle else False,
+        }
+
+    def restore(self, row):
+        # back to a frame of a replay log, for drawing it
+        self.y, self.vy, self.dodged = row["y"], row["vy"], row["dodged"]
+        self.obstacles = []
+        if row["obstacle"]:
+            # the log has every field, the height drawn here is overwritten
+            obstacle = Obstacle(self.width, self.height, self.random)
+            obstacle.x, obstacle.height = row["obstacle_x"], row["obstacle_height"]
+            obstacle.y = self.floor - obstacle.height
+            obstacle.tx, obstacle.ty = row["obstacle_tx"], row["obstacle_ty"]
+            obstacle.dodged, obstacle.hit_target = row["obstacle_dodged"], row["obstacle_hit_target"]
+            self.obstacles.append(obstacle)
+
+    def observe(self):
+        # the network only decides while the player stands on the floor
+        if not self.grounded:
+            return None
+        # find closest obstacle still in front of player
+        closest = None
+        dist = 0
+        for obstacle in self.obstacles:
+            if obstacle.x > self.x + PLAYER_SIZE:
+                if closest == None or obstacle.x < closest.x:
+                    closest = obstacle
+                    dist = obstacle.right - (self.x + PLAYER_SIZE)
+
+        height = closest.height if closest is not None else 0
+        targ_dist = math.sqrt((closest.tx - self.x) ** 2 + (closest.ty - self.y) ** 2) if height > 0 else 0
+        # input distance to next obstacle
+        return (dist, height, targ_dist)
+
+    # advance one frame and return the reward earned. output is only used when observe() asked for it
+    def step(self, output):
+        jump = False
+        if not self.grounded:
+            self.y = rect_round(self.y + self.vy)
+            self.vy += self.gravity
+            # check if player is on the floor
+            if self.y + PLAYER_SIZE > self.floor:
+                self.y = self.floor - PLAYER_SIZE
+                # reset vy
+                self.vy = 0
+        elif output is not None:
+            dec = output[0]
+            if dec >= 5:
+                self.vy = -1 * dec
+                jump = True
+
+        if len(self.obstacles) < 1:
+            self.obstacles.append(Obstacle(self.width, self.height, self.random))
+
+        if self.profiler is not None:
+            self.profiler.lap("physics")
+
+        state = self.update()
+        state["jump"] = jump
+        # penalize jumping off the top of the screen
+        state["out_of_bounds"] = self.out_of_bounds()
+        self.frames += 1
+        return self.reward.one(state, self.contributions)
+
+    def update(self):
+        # move the obstacles, and count what happened to them for the reward
+        crash = dodge = target = 0
+        for obstacle in list(self.obstacles):
+            obstacle.move()
+            if obstacle.right < 0:
+                self.obstacles.remove(obstacle)
+            elif overlap(*self.player_rect, *obstacle.rect):
+                crash += 1
+                self.obstacles.remove(obstacle)
+            # check if player dodged obstacle
+            elif obstacle.right < self.x and not obstacle.dodged:
+                self.dodged += 1
+                obstacle.dodged = True
+                dodge += 1
+            # if the target is hit, add more fitness
+            if overlap(*self.player_rect, *obstacle.target_rect) and not obstacle.hit_target:
+                target += 1
+                obstacle.hit_target = True
+        return {"crash": crash, "dodge": dodge, "target": target}
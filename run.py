@@ -0,0 +1,391 @@
+import argparse
+import functools
+import ipaddress
+import os
+import pickle
+import random
+from common import games
+
+# One entry point for every game.
+#   python run.py bounds train --generations 30 --workers 4 --seed 1
+#   python run.py fov train --batch --scenarios 3 --patience 100
+#   python run.py bounds train --scenarios 3 --fixed-seeds --cache-file bounds/fitness-cache
+#   python run.py jumping train                      continues from the newest snapshot, see common/checkpoint.py
+#   python run.py jumping train --fresh              starts over
+#   python run.py bounds test --follow-mouse         watch best.pickle play
+#   python run.py fov record --skip 2 --scale 2      watch and save a clip to clips/
+#   python run.py jumping test --speed 30            watch in slow motion, arrow keys double or halve the speed
+#   python run.py fov train --profile                where every frame's time goes, per generation
+#   python run.py fov train --history 60             remember more past positions against loitering
+#   python run.py fov train --view 5                 watch the whole population train, every 5th frame
+#   python run.py bounds train --clips               record every new best genome while training goes on
+#   python run.py fov train --batch --reward closer=0.3 --reward-terms      tune the reward, see common/rewards.py
+#   python run.py fov bench --envs 2000 --workers 4  steps/s of the game alone, see common/envs.py
+#   python run.py fov train --listen 0.0.0.0:6000 --authkey KEY     other machines play the episodes, see common/distributed.py
+#   python run.py fov worker --connect trainer:6000 --authkey KEY   one of those machines
+#   python run.py fov test --log logs/fov-best.npz   keep the episode as a replay log, see common/replay.py
+#   python run.py fov replay --log logs/fov-best.npz draw a replay log again, to clips/fov-replay.mp4
+# neat, pygame and moviepy are only imported by the modes that need them: training only
+# touches pygame with --view, and only record loads the video encoder.
+
+# where --authkey of distributed training comes from when it is not given
+AUTHKEY_VARIABLE = "NEAT_AUTHKEY"
+
+def early_stop(args):
+    if args.patience is None and args.out_of_bounds is None and args.threshold is None and args.quantile is None:
+        return None
+    from common.early_stop import EarlyStop
+    return EarlyStop(args.patience, args.out_of_bounds, args.threshold, args.quantile)
+
+
+def sim_options(args):
+    # extra Sim arguments, given to every Sim, BatchSim and Game of the run
+    options = {"history": args.history} if args.history is not None else {}
+    if args.reward:
+        options["reward"] = games.load(args.game, "Sim").REWARD.tune(**args.reward)
+    return options
+
+
+def run_options(args):
+    # the same as run.py arguments, for a run.py started from this one
+    options = ["--history", str(args.history)] if args.history is not None else []
+    for name, value in args.reward.items():
+        options += ["--reward", f"{name}={value}"]
+    return options
+
+
+def fitness_cache(args):
+    if not args.cache and not args.cache_file:
+        return None
+    import hashlib
+    from common.cache import FitnessCache
+    # cached fitness is only valid for the rules it was played with
+    with open(games.path(args.game, "Sim.py"), "rb") as f:
+        salt = hashlib.blake2b(f.read(), digest_size=8).hexdigest()
+    if args.history is not None:
+        salt += f"-history{args.history}"
+    for name, value in sorted(args.reward.items()):
+        salt += f"-{name}={value!r}"
+    return FitnessCache(args.cache_size, args.cache_file, salt)
+
+
+def train(args):
+    import neat
+    from common.checkpoint import CheckpointStore
+    from common.pipeline import ChampionReporter
+    game = args.game
+    random.seed(args.seed)
+    # training picks up from the newest snapshot in the checkpoint directory unless --fresh
+    store = CheckpointStore(args.checkpoint_dir or games.path(game, "checkpoints"),
+                            args.checkpoint_every or games.CHECKPOINT_EVERY[game])
+    if args.fresh:
+        store.clear()
+    p = store.start(games.config(game))
+    # a resumed run keeps its run seed, so it plays the episodes it would have played without stopping
+    seed = args.seed if args.seed is not None else store.meta.get("seed")
+    p.add_reporter(neat.StdOutReporter(True))
+    p.add_reporter(neat.StatisticsReporter())
+    # every new best genome is pickled (and with --clips recorded, with --logs logged) in the background as soon as it is found
+    genome_path = args.genome or games.path(game, "best.pickle")
+    champions = ChampionReporter(genome_path, game, p.best_genome, run_options(args), args.clips, args.logs, sim_options(args))
+    p.add_reporter(champions)
+
+    stop = early_stop(args)
+    profiler = None
+    if args.profile:
+        from common.profiler import Profiler, ProfileReporter
+        profiler = Profiler()
+        p.add_reporter(ProfileReporter(profiler))
+    cache = fitness_cache(args)
+    if cache is not None:
+        from common.cache import CacheReporter
+        p.add_reporter(CacheReporter(cache))
+    if args.listen:
+        from common.episode import eval_genome
+        from common.distributed import DistributedEvaluator
+        # episodes are played by workers that connect to this process, see common/distributed.py.
+        # Without a key only this machine listens, and a random key leaves it to the --local-workers
+        authkey = args.authkey.encode() if args.authkey else os.urandom(32)
+        evaluator = DistributedEvaluator(functools.partial(eval_genome, game, **sim_options(args)), address(args.listen),
+                                         authkey, args.local_workers, timeout=args.worker_timeout,
+                                         seed=seed, scenarios=args.scenarios, stop=stop, cache=cache,
+                                         fixed_seeds=args.fixed_seeds)
+        print("listening on %s:%s" % evaluator.address)
+        if not args.authkey:
+            print("no --authkey, only the --local-workers can connect")
+    elif args.batch or args.view:
+        from common.batch import BatchEvaluator
+        viewer = None
+        if args.view:
+            from common.viewer import Viewer
+            viewer = Viewer(p, games.WIDTH, games.HEIGHT, args.view)
+        BatchSim = functools.partial(games.load(game, "BatchSim").BatchSim, **sim_options(args))
+        evaluator = BatchEvaluator(BatchSim, games.WIDTH, games.HEIGHT, seed, args.scenarios, stop,
+                                   cache, args.fixed_seeds, viewer, args.reward_terms)
+    else:
+        from common.episode import eval_genome
+        from common.parallel import ParallelEvaluator
+        # the profiler lives in this process, so profiled runs evaluate in-process
+        workers = 1 if profiler is not None else args.workers
+        evaluator = ParallelEvaluator(functools.partial(eval_genome, game, profiler=profiler, **sim_options(args)), workers, seed,
+                                      scenarios=args.scenarios, stop=stop, cache=cache, fixed_seeds=args.fixed_seeds)
+    evaluator.generation = p.generation
+    store.meta["seed"] = evaluator.seed
+    print("run seed", evaluator.seed)
+    try:
+        winner = p.run(evaluator.evaluate, args.generations or games.GENERATIONS[game])
+    finally:
+        evaluator.close()
+        store.close()
+        champions.close()
+        if cache is not None:
+            cache.close()
+    with open(genome_path, "wb") as f:
+        pickle.dump(winner, f)
+
+
+def watch(args, record):
+    import pygame as pg
+    game = args.game
+    Game = games.load(game, "Game").Game
+    config = games.config(game)
+    genome = games.best_genome(game, args.genome)
+    options = {"follow_mouse": True} if args.follow_mouse else {}
+    game_options = sim_options(args)
+    profiler = None
+    if args.profile:
+        from common.profiler import Profiler
+        profiler = Profiler()
+
+    pg.init()
+    win = pg.display.set_mode((games.WIDTH, games.HEIGHT))
+    pg.display.set_caption("Testing genome")
+    if args.speed is not None:
+        game_options["speed"] = args.speed
+    g = Game(win, games.WIDTH, games.HEIGHT, args.seed, **game_options)
+    if args.reward_terms:
+        g.sim.contributions = g.sim.reward.zeros()
+    if args.log:
+        from common.replay import EpisodeLog
+        # a tuned reward is kept in the log anyway, only what drawing it again needs goes into its options
+        options["log"] = EpisodeLog(g.sim, game, args.seed, {k: v for k, v in game_options.items() if k == "history"},
+                                    genome=genome.key)
+    if record:
+        from common.recorder import Recorder
+        with Recorder(args.clip or games.clip(game), 120, args.skip, args.scale) as recorder:
+            g.test(genome, config, recorder=recorder, profiler=profiler, **options)
+    else:
+        g.test(genome, config, profiler=profiler, **options)
+    pg.quit()
+    if args.log:
+        options["log"].save(args.log)
+        print("Saved", args.log)
+    if profiler is not None:
+        print(profiler.summary())
+    if args.reward_terms:
+        print(g.sim.reward.summary(g.sim.contributions))
+
+
+def replay(args):
+    # draw a replay log again, to a clip or to one png per frame
+    import pygame as pg
+    from common.replay import load, frames
+    log = load(args.log)
+    if log.meta["game"] != args.game:
+        raise SystemExit(f"{args.log} is a log of {log.meta['game']}, not {args.game}")
+    if args.frames:
+        os.makedirs(args.frames, exist_ok=True)
+        for i, frame in enumerate(frames(log)):
+            if i % args.skip == 0:
+                pg.image.save(pg.surfarray.make_surface(frame.swapaxes(0, 1)), os.path.join(args.frames, f"{i:05d}.png"))
+        print(f"Saved {log.frames} frames to {args.frames}")
+    else:
+        from common.recorder import Recorder
+        clip = args.clip or games.clip(args.game, "replay")
+        with Recorder(clip, 120, args.skip, args.scale) as recorder:
+            for frame in frames(log):
+                recorder.add(frame)
+        print("Saved", clip)
+    pg.quit()
+    print(f"fitness {log.meta['fitness']}, {log.frames} frames")
+
+
+def address(text):
+    # [HOST:]PORT, the host defaults to this machine only
+    host, _, port = text.rpartition(":")
+    return host or "localhost", int(port)
+
+
+def loopback(host):
+    # whether only this machine can reach host, 0.0.0.0 listens on every interface
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def worker(args):
+    from multiprocessing import AuthenticationError
+    from common.distributed import work
+    try:
+        played = work(address(args.connect), args.authkey.encode(), args.wait)
+    except AuthenticationError:
+        raise SystemExit(f"{args.connect} rejected the authkey")
+    print(f"coordinator closed the connection, played {played} episodes")
+
+
+def bench(args):
+    # steps/s of the game's vectorized env on its own, with random actions instead of networks
+    import time
+    import numpy as np
+    from common.envs import VectorEnv, AsyncVectorEnv, rollout
+    options = sim_options(args)
+    if args.workers and args.workers > 1:
+        env = AsyncVectorEnv(args.game, args.workers, **options)
+    else:
+        env = VectorEnv(args.game, **options)
+    rng = np.random.default_rng(args.seed)
+    seeds = rng.integers(2 ** 32, size=args.envs).tolist()
+    with env:
+        start = time.perf_counter()
+        returns = rollout(env, seeds, lambda obs, deciding: rng.normal(0, 5, (len(obs), env.actions)))
+        elapsed = time.perf_counter() - start
+    steps = args.envs * env.horizon
+    print(f"{args.envs} {args.game} episodes of {env.horizon} frames in {elapsed:.2f} sec, "
+          f"{steps / elapsed:,.0f} steps/s, mean return {returns.mean():.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Train, watch or record NEAT on any of the games")
+    parser.add_argument("game", choices=games.GAMES)
+    parser.add_argument("mode", choices=("train", "test", "record", "replay", "bench", "worker"))
+    parser.add_argument("--seed", type=int, help="run seed when training, episode seed when testing")
+    parser.add_argument("--profile", action="store_true", help="time every phase of a frame, see common/profiler.py")
+    parser.add_argument("--genome", help="genome pickle to write (train) or read (test, record), defaults to <game>/best.pickle")
+    parser.add_argument("--reward", action="append", default=[], metavar="TERM=VALUE",
+                        help="change what a reward term in the game's Sim.py is worth, e.g. --reward closer=0.2")
+    parser.add_argument("--reward-terms", action="store_true",
+                        help="print what every reward term added to the fitness (test, record, train --batch)")
+    parser.add_argument("--history", type=int, help="past positions remembered against standing still (fov), defaults to 15")
+
+    group = parser.add_argument_group("train")
+    group.add_argument("--generations", type=int, help="defaults to the game's usual count")
+    group.add_argument("--workers", type=int,
+                       help="processes evaluating genomes, defaults to every core. bench: processes stepping envs, defaults to none")
+    group.add_argument("--batch", action="store_true", help="simulate the whole population at once with BatchSim")
+    group.add_argument("--view", type=int, nargs="?", const=1, metavar="N",
+                       help="draw the whole population in one window every N-th frame, implies --batch")
+    group.add_argument("--scenarios", type=int, help="score every genome on the same K episodes per generation")
+    group.add_argument("--fixed-seeds", action="store_true", help="replay the first generation's episodes every generation")
+    group.add_argument("--clips", action="store_true", help="record every new best genome to clips/<game>-generation-N.mp4 in the background")
+    group.add_argument("--logs", action="store_true", help="keep a replay log of every new best genome in logs/<game>-generation-N.npz")
+    group.add_argument("--checkpoint-every", type=int, help="generations between snapshots")
+    group.add_argument("--checkpoint-dir", help="where snapshots go, defaults to <game>/checkpoints")
+    group.add_argument("--fresh", action="store_true", help="start a new population instead of resuming the newest snapshot")
+
+    group = parser.add_argument_group("bench, see common/envs.py")
+    group.add_argument("--envs", type=int, default=1000, help="episodes stepped together")
+
+    group = parser.add_argument_group("distributed training, see common/distributed.py")
+    group.add_argument("--listen", metavar="[HOST:]PORT", help="train: hand the episodes out to workers connecting here")
+    group.add_argument("--local-workers", type=int, default=0, help="train: also start this many workers on this machine")
+    group.add_argument("--worker-timeout", type=float, help="train: seconds a batch may take before it goes to another worker")
+    group.add_argument("--connect", metavar="HOST:PORT", help="worker: the coordinator to play episodes for")
+    group.add_argument("--wait", type=float, default=60, help="worker: seconds to keep trying to reach the coordinator")
+    group.add_argument("--authkey", default=os.environ.get(AUTHKEY_VARIABLE),
+                       help=f"shared secret of the coordinator and its workers, defaults to ${AUTHKEY_VARIABLE}. "
+                            "Anyone who has it can run code on them")
+
+    group = parser.add_argument_group("fitness cache, see common/cache.py")
+    group.add_argument("--cache", action="store_true", help="never simulate the same network on the same episode twice")
+    group.add_argument("--cache-size", type=int, default=100000, help="episodes kept in memory")
+    group.add_argument("--cache-file", help="also keep every episode in this file across runs, implies --cache")
+
+    group = parser.add_argument_group("early stop, see common/early_stop.py")
+    group.add_argument("--patience", type=int, help="frames without a new best fitness")
+    group.add_argument("--out-of-bounds", type=int, help="frames in a row spent off screen")
+    group.add_argument("--threshold", type=float, help="projected fitness to beat")
+    group.add_argument("--quantile", type=float, help="set the threshold from last generation's fitness")
+
+    group = parser.add_argument_group("test, record and replay")
+    group.add_argument("--follow-mouse", action="store_true", help="the target follows the mouse (bounds, fov)")
+    group.add_argument("--clip", help="video path, defaults to clips/<game>-best.mp4 (replay: clips/<game>-replay.mp4)")
+    group.add_argument("--log", help="replay log to write (test, record) or draw (replay), see common/replay.py")
+    group.add_argument("--frames", help="replay: save every frame as a png in this directory instead of a clip")
+    group.add_argument("--skip", type=int, default=1, help="record every n-th frame")
+    group.add_argument("--scale", type=int, default=1, help="shrink recorded frames by this factor")
+    group.add_argument("--speed", type=int, help="simulation steps per second, 0 for as fast as possible, see common/scheduler.py")
+
+    args = parser.parse_args(argv)
+    if args.follow_mouse and args.game not in games.FOLLOW_MOUSE:
+        parser.error(f"{args.game} has no follow mouse mode")
+    if args.history is not None and args.game not in games.HISTORY:
+        parser.error(f"{args.game} has no position history")
+    if args.history is not None and args.history < 1:
+        parser.error("--history must be at least 1")
+    values = {}
+    for item in args.reward:
+        name, _, value = item.partition("=")
+        try:
+            values[name] = float(value)
+        except ValueError:
+            parser.error(f"--reward needs TERM=VALUE, got {item!r}")
+    args.reward = values
+    if values:
+        try:
+            games.load(args.game, "Sim").REWARD.tune(**values)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.reward_terms and args.mode == "train" and not (args.batch or args.view):
+        parser.error("--reward-terms adds up the terms of BatchSim when training, add --batch")
+    for option in ("patience", "out_of_bounds"):
+        value = getattr(args, option)
+        if value is not None and value < 1:
+            parser.error(f"--{option.replace('_', '-')} must be at least 1 frame")
+    if args.speed is not None and args.speed < 0:
+        parser.error("--speed can not be negative")
+    if args.envs < 1:
+        parser.error("--envs must be at least 1")
+    if args.view is not None and args.view < 1:
+        parser.error("--view N must be at least 1")
+    if args.profile and (args.batch or args.view):
+        parser.error("--profile times Game frames, it can not be used with --batch")
+
+    if args.mode == "replay" and not args.log:
+        parser.error("replay needs --log")
+    if args.mode == "worker" and not args.connect:
+        parser.error("worker needs --connect HOST:PORT")
+    if args.listen and (args.batch or args.view or args.profile):
+        parser.error("--listen plays episodes on workers, it can not be used with --batch, --view or --profile")
+    if args.local_workers and not args.listen:
+        parser.error("--local-workers needs --listen")
+    for option in ("listen", "connect"):
+        value = getattr(args, option)
+        if value:
+            try:
+                address(value)
+            except ValueError:
+                parser.error(f"--{option} needs [HOST:]PORT, got {value!r}")
+    # the connections carry pickles, whoever knows the key can run code on the other end
+    if args.mode == "worker" and not args.authkey:
+        parser.error(f"worker needs the coordinator's --authkey (or ${AUTHKEY_VARIABLE})")
+    if args.listen and not args.authkey and not loopback(address(args.listen)[0]):
+        parser.error(f"--listen on other machines' reach needs --authkey (or ${AUTHKEY_VARIABLE}), "
+                     "anyone reaching the port could run code here")
+
+    if args.mode == "train":
+        train(args)
+    elif args.mode == "replay":
+        replay(args)
+    elif args.mode == "bench":
+        bench(args)
+    elif args.mode == "worker":
+        worker(args)
+    else:
+        watch(args, record=args.mode == "record")
+
+
+if __name__ == "__main__":
+    main()